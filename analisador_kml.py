@@ -0,0 +1,1111 @@
+"""
+Núcleo do analisador de projetos de fibra ótica, sem interface.
+
+Leitura e medição dos arquivos KML/KMZ, tabelas LINK e GPON, listas de
+materiais, mapa e exportação para Excel/JSON. Usado pelo aplicativo do Streamlit
+(projetos_kml1.1.py) e pela linha de comando, para gerar os relatórios em
+lote sem abrir uma página:
+
+    python analisador_kml.py projeto1.kml projeto2.kmz --saida relatorios --formato ambos
+
+Não importa streamlit nem plotly; o folium só é importado ao montar um mapa.
+"""
+import argparse
+import json
+import os
+import sys
+from io import BytesIO
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+import instrumentacao
+import leitor_kml
+import processamento_paralelo
+import simplificacao
+
+# Formatos aceitos pela linha de comando
+FORMATOS = ("excel", "json", "ambos")
+
+
+class TabelaComTotal(NamedTuple):
+    """Tabela do relatório com a linha de total à parte, juntada só para exibir ou exportar."""
+    dados: pd.DataFrame  # uma linha por item, indexada pelo ID
+    total: dict  # valor de cada coluna de `dados` na linha de total
+
+def distancias_medidas(medidas, indices):
+    """Distância (arredondada em metros) de cada LineString da lista, já medida por medir_documento."""
+    return [round(float(distancia), 0) for distancia in medidas.comprimentos[indices]]
+
+def linha_mapa(documento, medidas, nome_placemark, indice, color, line_style, distancia):
+    """Entrada de coordenadas_por_pasta: coordenadas e importância são visões sem cópia."""
+    return (nome_placemark, documento.geometria.linha(indice), color, line_style, distancia,
+            medidas.importancia_linha(documento.geometria, indice))
+
+def processar_folder_link(documento, folder, medidas):
+    if documento.indice[folder].dentro_gpon:
+        return 0.0, [], [], [], [], False
+    
+    distancia_folder = 0.0
+    dados = []
+    coordenadas_folder = []
+    dados_em_andamento = []
+    dados_concluido = []
+
+
+    nome_folder = documento.nome(folder)
+    is_link_parceiros = documento.indice[folder].is_link_parceiros
+    
+    if is_link_parceiros:
+        color = "red"
+    elif "AMARELO" in nome_folder.upper():
+        color = "yellow"
+    elif "VERDE" in nome_folder.upper():
+        color = "green"
+    else:
+        color = "blue"
+    
+    # Pastas LINK aninhadas são processadas separadamente por processar_kml
+    def outra_pasta_link(pasta):
+        return documento.indice[pasta].is_link
+    
+    if is_link_parceiros:
+        linhas = []
+        for placemark in documento.placemarks_em(folder, parar_em=outra_pasta_link):
+            nome_placemark = "Sem Nome" if placemark.nome is None else placemark.nome
+            
+            for line_string in placemark.linestrings:
+                linhas.append((nome_placemark, line_string.indice))
+        
+        distancias = distancias_medidas(medidas, [indice for _, indice in linhas])
+        for (nome_placemark, indice), distancia in zip(linhas, distancias):
+            distancia_folder += distancia
+            
+            dados.append([nome_folder, nome_placemark, distancia])
+            coordenadas_folder.append(linha_mapa(documento, medidas, nome_placemark, indice, color, "solid", distancia))
+        
+        return distancia_folder, dados, coordenadas_folder, [], [], is_link_parceiros
+    
+    linhas = []
+    for placemark in documento.placemarks_em(folder, parar_em=outra_pasta_link):
+        # Placemarks soltos na raiz da pasta LINK não pertencem a nenhuma subpasta de rotas
+        if placemark.pasta == folder:
+            continue
+        
+        # O índice já traz o status da subpasta mais próxima do placemark que indique um
+        status = documento.indice[placemark.pasta].status
+        is_em_andamento = status == leitor_kml.STATUS_EM_ANDAMENTO
+        is_concluido = status == leitor_kml.STATUS_CONCLUIDO
+        
+        nome_placemark = "Sem Nome" if placemark.nome is None else placemark.nome
+        
+        if placemark.estilo in documento.estilos:
+            color = documento.estilos[placemark.estilo]
+        
+        for line_string in placemark.linestrings:
+            linhas.append((nome_placemark, line_string.indice, color, is_em_andamento, is_concluido))
+    
+    distancias = distancias_medidas(medidas, [linha[1] for linha in linhas])
+    for (nome_placemark, indice, color, is_em_andamento, is_concluido), distancia in zip(linhas, distancias):
+        distancia_folder += distancia
+        
+        if is_em_andamento:
+            dados_em_andamento.append([nome_folder, nome_placemark, distancia])
+            coordenadas_folder.append(linha_mapa(documento, medidas, nome_placemark, indice, color, "dashed", distancia))
+        elif is_concluido:
+            dados_concluido.append([nome_folder, nome_placemark, distancia])
+            coordenadas_folder.append(linha_mapa(documento, medidas, nome_placemark, indice, color, "solid", distancia))
+        else:
+            dados.append([nome_folder, nome_placemark, distancia])
+            coordenadas_folder.append(linha_mapa(documento, medidas, nome_placemark, indice, color, "solid", distancia))
+    
+    return distancia_folder, dados, coordenadas_folder, dados_em_andamento, dados_concluido, is_link_parceiros
+
+def buscar_ctos(documento, folder):
+    """
+    Lista as pastas CTO'S abaixo de `folder` (em ordem de documento) com as suas rotas.
+    Cada pasta é identificada pelo id, então pastas CTO'S com o mesmo nome não se confundem;
+    a contagem de placemarks de cada rota vem do total por subárvore, calculado uma única vez.
+    """
+    placemarks_por_subarvore = documento.placemarks_por_subarvore()
+    ctos = []
+    
+    for subpasta in documento.descendentes(folder):
+        if not documento.indice[subpasta].is_ctos:
+            continue
+        
+        dados_cto = {"nome": documento.nome(subpasta, "Subpasta Desconhecida"), "rotas": []}
+        
+        for rota in documento.descendentes(subpasta):
+            dados_cto["rotas"].append({
+                "nome_rota": documento.nome(rota, "Rota Desconhecida"),
+                "quantidade_placemarks": placemarks_por_subarvore[rota]
+            })
+        
+        ctos.append(dados_cto)
+    
+    return ctos
+
+def processar_pop_gpon(documento, subpasta, medidas):
+    nome_subpasta = documento.nome(subpasta, "Subpasta Desconhecida")
+    dados_subpasta = {"nome": nome_subpasta, "ctos": buscar_ctos(documento, subpasta), "linestrings": []}
+    
+    # Uma GPON aninhada dentro do POP tem os seus próprios POPs
+    def outra_pasta_gpon(pasta):
+        return documento.indice[pasta].is_gpon
+    
+    linhas = []
+    for placemark in documento.placemarks_em(subpasta, parar_em=outra_pasta_gpon):
+        for line_string in placemark.linestrings:
+            linhas.append(("Sem Nome" if placemark.nome is None else placemark.nome, line_string.indice))
+    
+    distancias = distancias_medidas(medidas, [indice for _, indice in linhas])
+    dados_subpasta["linestrings"].extend(zip((nome for nome, _ in linhas), distancias))
+    
+    return dados_subpasta
+
+@instrumentacao.instrumentado
+def processar_kml(documento, processos=None, medidas=None):
+    # Medições (a parte pesada) primeiro, divididas por pasta LINK e POP de GPON
+    if medidas is None:
+        with instrumentacao.medir_etapa("medir_documento", linhas=len(documento.geometria)):
+            medidas = processamento_paralelo.medir_documento(documento, processos)
+
+    distancia_total = 0.0
+    dados_por_pasta = {}
+    coordenadas_por_pasta = {}
+    cidades_coords = []
+    dados_em_andamento = []
+    dados_concluido = []
+    dados_link_parceiros = []
+    dados_gpon = {}
+
+    for folder in documento.descendentes():
+        nome_folder = documento.nome(folder)
+        info_folder = documento.indice[folder]
+
+        if nome_folder in dados_por_pasta:
+            continue
+
+        if info_folder.is_link:
+            distancia_folder, dados, coordenadas_folder, em_andamento, concluido, is_link_parceiros = processar_folder_link(documento, folder, medidas)
+            distancia_total += distancia_folder
+
+            if is_link_parceiros:
+                dados_link_parceiros.extend(dados)
+                coordenadas_por_pasta.setdefault(nome_folder, []).extend(coordenadas_folder)
+            else:
+                if nome_folder not in dados_por_pasta:
+                    dados_por_pasta[nome_folder] = (distancia_folder, [])
+                dados_por_pasta[nome_folder][1].extend(dados)
+                coordenadas_por_pasta.setdefault(nome_folder, []).extend(coordenadas_folder)
+                dados_em_andamento.extend(em_andamento)
+                dados_concluido.extend(concluido)
+
+        if info_folder.is_cidades:
+            def outra_pasta_cidades(pasta):
+                return documento.indice[pasta].is_cidades
+
+            for placemark in documento.placemarks_em(folder, parar_em=outra_pasta_cidades):
+                nome = "Sem Nome" if placemark.nome is None else placemark.nome
+                if placemark.ponto is not None:
+                    cidades_coords.append((nome, placemark.ponto.coordenadas))
+
+        if info_folder.is_gpon:
+            if nome_folder not in dados_gpon:
+                dados_gpon[nome_folder] = {"primeiro_nivel": []}
+
+            for subpasta in documento.subpastas(folder):
+                nome_subpasta = documento.nome(subpasta, "Subpasta Desconhecida")
+                
+                if any(sp["nome"] == nome_subpasta for sp in dados_gpon[nome_folder]["primeiro_nivel"]):
+                    continue
+
+                dados_gpon[nome_folder]["primeiro_nivel"].append(processar_pop_gpon(documento, subpasta, medidas))
+
+    return distancia_total, dados_por_pasta, coordenadas_por_pasta, cidades_coords, dados_gpon, dados_em_andamento, dados_concluido, dados_link_parceiros
+
+
+def tabela_com_total(dados, coluna_rotulo):
+    """
+    TabelaComTotal de `dados`: as colunas numéricas são somadas (as de ponto flutuante
+    arredondadas a duas casas), as demais ficam vazias e `coluna_rotulo` recebe "Total".
+    """
+    total = {coluna: "" for coluna in dados.columns}
+    for coluna in dados.select_dtypes("number").columns:
+        soma = dados[coluna].sum()
+        total[coluna] = round(float(soma), 2) if pd.api.types.is_float_dtype(dados[coluna]) else int(soma)
+    total[coluna_rotulo] = "Total"
+    return TabelaComTotal(dados, total)
+
+def separar_total(tabela):
+    """(dados, linha de total) de uma tabela do relatório; a linha é None nas tabelas sem total."""
+    if isinstance(tabela, TabelaComTotal):
+        return tabela
+    return tabela, None
+
+def com_total(tabela):
+    """DataFrame da tabela com a linha de total no final (com o ID vazio), para exibição."""
+    dados, total = separar_total(tabela)
+    if total is None:
+        return dados
+    linha_total = pd.DataFrame([total], index=pd.Index([""], name=dados.index.name))
+    if dados.empty:
+        return linha_total
+    return pd.concat([dados, linha_total])
+
+@instrumentacao.instrumentado
+def tabela_dashboard_gpon(dados_gpon):
+    """Tabela POP / Rotas / CTO'S / Fibra Ótica (TabelaComTotal), ou None sem dados GPON."""
+    dados_tabela = []
+    
+    for nome_gpon, dados in dados_gpon.items():
+        if "primeiro_nivel" in dados:
+            for subpasta in dados["primeiro_nivel"]:
+                total_rotas = 0
+                total_placemarks = 0
+                soma_distancia = 0.0
+                
+                if "ctos" in subpasta:
+                    for cto in subpasta["ctos"]:
+                        if "rotas" in cto:
+                            total_rotas += len(cto["rotas"])
+                            for rota in cto["rotas"]:
+                                total_placemarks += rota["quantidade_placemarks"]
+                
+                if "linestrings" in subpasta:
+                    soma_distancia = sum(distancia for _, distancia in subpasta["linestrings"])
+                
+                dados_tabela.append({
+                    "POP": subpasta["nome"],
+                    "Rotas": total_rotas,
+                    "CTO'S": total_placemarks,
+                    "Fibra Ótica (metros)": round(soma_distancia, 2)
+                })
+    
+    if not dados_tabela:
+        return None
+    
+    # Cria o DataFrame, com as contagens em int32
+    df_tabela = pd.DataFrame(dados_tabela).astype({"Rotas": "int32", "CTO'S": "int32"})
+    df_tabela.index = pd.RangeIndex(1, len(df_tabela) + 1, name="ID")
+    
+    return tabela_com_total(df_tabela, "POP")
+
+def calcular_porcentagem_concluida(dados_por_pasta, dados_concluido):
+    porcentagens = {}
+    
+    for nome_folder, (distancia_total, _) in dados_por_pasta.items():
+        distancia_concluida = sum(linha[2] for linha in dados_concluido if linha[0] == nome_folder)
+        
+        if distancia_total > 0:
+            porcentagem = (distancia_concluida / distancia_total) * 100
+        else:
+            porcentagem = 0.0
+        
+        porcentagens[nome_folder] = porcentagem
+    
+    return porcentagens
+
+
+# Parâmetros das listas de materiais: margens de cabo (cabo lançado por metro projetado),
+# metros de cabo por unidade de cada material e a regra das CEO's do LINK. Cada cenário
+# de comparar_cenarios pode trocar qualquer um deles.
+PARAMETROS_PADRAO = {
+    "margem_cabo_link": 1.10,
+    "metros_por_parafuso_olhal": 70,
+    "metros_por_alca_branca_link": 35,
+    "metros_por_plaqueta_link": 100,
+    "metros_por_arame_espinar_link": 10_000,
+    # Uma CEO a cada 3.000 m de cabo, 30% delas 24FO e o restante 24FO MINI
+    "metros_cabo_por_ceo": 3_000,
+    "fracao_ceos_24fo": 0.3,
+    "margem_cabo_gpon": 1.20,
+    "metros_por_fecho_gpon": 50,
+    "metros_por_supa_gpon": 50,
+    "metros_por_alca_branca_gpon": 25,
+    "metros_por_arame_espinar_gpon": 8_000,
+    "metros_por_fita_aco_gpon": 1_000,
+    "metros_por_plaqueta_gpon": 120,
+}
+# Materiais de lançamento: (coluna, parâmetro com os metros de cabo por unidade)
+MATERIAIS_LANCAMENTO_LINK = (
+    ("Parafuso Olhal (un)", "metros_por_parafuso_olhal"),
+    ("Alça Branca (un)", "metros_por_alca_branca_link"),
+    ("Plaqueta (un)", "metros_por_plaqueta_link"),
+    ("Arame Espinar (un)", "metros_por_arame_espinar_link"),
+)
+MATERIAIS_LANCAMENTO_GPON = (
+    ("Fecho (un)", "metros_por_fecho_gpon"),
+    ("Supa (un)", "metros_por_supa_gpon"),
+    ("Alça Branca (un)", "metros_por_alca_branca_gpon"),
+    ("Arame Espinar (un)", "metros_por_arame_espinar_gpon"),
+    ("Fita de Aço (un)", "metros_por_fita_aco_gpon"),
+    ("Plaqueta (un)", "metros_por_plaqueta_gpon"),
+)
+# Rotas × cenários calculados de uma vez em comparar_cenarios (blocos pequenos cabem no
+# cache do processador e são mais rápidos que um único bloco com todas as rotas)
+ELEMENTOS_POR_BLOCO = 1 << 16
+
+# As funções abaixo aceitam arrays de qualquer formato: com as distâncias em uma coluna
+# (rotas, 1) e os parâmetros em uma linha (1, cenários), o NumPy calcula todas as
+# combinações de uma vez.
+
+def quantidades_por_cabo(cabo, materiais, parametros=PARAMETROS_PADRAO, arredondar_para_cima=True):
+    """
+    Quantidade de cada material de `materiais` para os comprimentos de cabo em `cabo`
+    (metros), como {coluna: array}. Com `arredondar_para_cima`, as quantidades são
+    inteiras (int32), arredondadas para cima e com mínimo 1; sem ele, ficam com duas
+    casas decimais.
+    """
+    quantidades = {}
+    for coluna, parametro in materiais:
+        quantidade = cabo / parametros[parametro]
+        if arredondar_para_cima:
+            quantidades[coluna] = np.maximum(1, np.ceil(quantidade)).astype("int32")
+        else:
+            quantidades[coluna] = np.round(quantidade, 2)
+    return quantidades
+
+def cabo_link(distancia, parametros=PARAMETROS_PADRAO):
+    """CABO 12FO (distância + margem) em metros, arredondado ao centímetro."""
+    return np.round(distancia * parametros["margem_cabo_link"], 2)
+
+def ceos_link(cabo, parametros=PARAMETROS_PADRAO):
+    """CEO'S 24FO e 24FO MINI: o total arredondado para cima (mínimo 1), dividido entre os dois tipos."""
+    qtd_ceos = np.maximum(1, np.ceil(cabo / parametros["metros_cabo_por_ceo"]))
+    ceos_24fo = np.maximum(1, np.round(qtd_ceos * parametros["fracao_ceos_24fo"]))
+    ceos_24fo_mini = np.maximum(1, np.round(qtd_ceos * (1 - parametros["fracao_ceos_24fo"])))
+    return ceos_24fo.astype("int32"), ceos_24fo_mini.astype("int32")
+
+def distancias_pops(dados_gpon):
+    """Nomes dos POPs e a soma das distâncias dos seus cabos (array, em metros)."""
+    pops = []
+    distancias = []
+    for nome_gpon, dados in dados_gpon.items():
+        for subpasta in dados.get("primeiro_nivel", []):
+            pops.append(subpasta["nome"])
+            distancias.append(sum(distancia for _, distancia in subpasta["linestrings"]))
+    return pops, np.array(distancias, dtype="float64")
+
+@instrumentacao.instrumentado
+def criar_orcamento_lancamento_link_por_rota(dados_tabela_pastas):
+    """
+    Calcula os materiais necessários para lançamento do LINK por rota individual,
+    com todas as rotas de uma vez (MATERIAIS_LANCAMENTO_LINK).
+    """
+    distancia = dados_tabela_pastas["Distância (m)"].to_numpy(dtype="float64")
+    cabo_12fo = cabo_link(distancia)
+    
+    df_orcamento = pd.DataFrame({
+        "Pasta": dados_tabela_pastas["Pasta"].to_numpy(),
+        "Rota": dados_tabela_pastas["ROTAS LINK"].to_numpy(),
+        "Distância Projetada (m)": np.round(distancia, 2),
+        "CABO 12FO (m)": cabo_12fo,
+        **quantidades_por_cabo(cabo_12fo, MATERIAIS_LANCAMENTO_LINK),
+    })
+    df_orcamento.index = pd.RangeIndex(1, len(df_orcamento) + 1, name="ID")
+    
+    # A linha de totais fica à parte
+    return tabela_com_total(df_orcamento, "Pasta")
+
+@instrumentacao.instrumentado
+def criar_orcamento_fusao_link_por_rota(dados_tabela_pastas):
+    """
+    Calcula os materiais necessários para fusão do LINK por rota individual.
+    Foca apenas em CEO'S 24FO e CEO'S 24FO MINI.
+    """
+    distancia = dados_tabela_pastas["Distância (m)"].to_numpy(dtype="float64")
+    ceos_24fo, ceos_24fo_mini = ceos_link(cabo_link(distancia))
+    
+    df_orcamento = pd.DataFrame({
+        "Pasta": dados_tabela_pastas["Pasta"].to_numpy(),
+        "Rota": dados_tabela_pastas["ROTAS LINK"].to_numpy(),
+        "Distância Projetada (m)": np.round(distancia, 2),
+        "CEO'S 24FO (un)": ceos_24fo,
+        "CEO'S 24FO MINI (un)": ceos_24fo_mini,
+    })
+    df_orcamento.index = pd.RangeIndex(1, len(df_orcamento) + 1, name="ID")
+    
+    # A linha de totais fica à parte
+    return tabela_com_total(df_orcamento, "Pasta")
+
+@instrumentacao.instrumentado
+def criar_orcamento_materiais(dados_gpon):
+    """
+    Materiais de lançamento GPON por POP (MATERIAIS_LANCAMENTO_GPON), calculados para
+    todos os POPs com fibra de uma vez.
+    """
+    pops, distancias = distancias_pops(dados_gpon)
+    
+    # Só inclui POPs com fibra; CABO 2FO = distância + 20%
+    com_fibra = distancias > 0
+    total_cabo = distancias[com_fibra] * PARAMETROS_PADRAO["margem_cabo_gpon"]
+    
+    df_orcamento = pd.DataFrame({
+        "POP": np.array(pops, dtype=object)[com_fibra],
+        "CABO 2FO (m)": np.round(total_cabo, 2),
+        **quantidades_por_cabo(total_cabo, MATERIAIS_LANCAMENTO_GPON, arredondar_para_cima=False),
+    })
+    
+    # Numera as linhas pelo ID; a linha de total fica à parte
+    df_orcamento.index = pd.RangeIndex(1, len(df_orcamento) + 1, name="ID")
+    
+    return tabela_com_total(df_orcamento, "POP")
+
+def parametros_cenarios(cenarios):
+    """
+    Parâmetros dos cenários de `cenarios` (DataFrame com um cenário por linha e colunas
+    com os nomes de PARAMETROS_PADRAO) como {parâmetro: array (1, cenários)}. Colunas e
+    células vazias usam o valor padrão; parâmetros desconhecidos, valores não numéricos
+    ou fora do intervalo geram ValueError.
+    """
+    desconhecidos = [str(coluna) for coluna in cenarios.columns if coluna not in PARAMETROS_PADRAO]
+    if desconhecidos:
+        raise ValueError(f"Parâmetros de cenário desconhecidos: {', '.join(desconhecidos)}")
+    
+    parametros = {}
+    for parametro, padrao in PARAMETROS_PADRAO.items():
+        if parametro in cenarios:
+            numericos = pd.to_numeric(cenarios[parametro], errors="coerce")
+            if (numericos.isna() & cenarios[parametro].notna()).any():
+                raise ValueError(f"Valor não numérico no parâmetro {parametro}")
+            valores = numericos.fillna(padrao).to_numpy(dtype="float64")
+        else:
+            valores = np.full(len(cenarios), padrao, dtype="float64")
+        
+        if parametro == "fracao_ceos_24fo":
+            validos = (valores >= 0) & (valores <= 1)
+        else:
+            validos = valores > 0
+        if not validos.all():
+            raise ValueError(f"Valor fora do intervalo no parâmetro {parametro}")
+        parametros[parametro] = valores[np.newaxis, :]
+    return parametros
+
+def _totais_por_cenario(distancias, calcular, parametros, quantidade_cenarios):
+    """
+    Soma, para cada cenário, as colunas de calcular(distâncias, parametros), com as
+    distâncias em blocos de até ELEMENTOS_POR_BLOCO rotas × cenários.
+    """
+    linhas_por_bloco = max(1, ELEMENTOS_POR_BLOCO // max(1, quantidade_cenarios))
+    totais = {}
+    # Pelo menos um bloco (mesmo vazio), para que todas as colunas apareçam
+    for inicio in range(0, max(1, len(distancias)), linhas_por_bloco):
+        bloco = distancias[inicio:inicio + linhas_por_bloco, np.newaxis]
+        for coluna, valores in calcular(bloco, parametros).items():
+            totais[coluna] = totais.get(coluna, 0) + valores.sum(axis=0)
+    return totais
+
+def _orcamento_link(distancia, parametros):
+    cabo = cabo_link(distancia, parametros)
+    ceos_24fo, ceos_24fo_mini = ceos_link(cabo, parametros)
+    return {
+        "CABO 12FO (m)": cabo,
+        **quantidades_por_cabo(cabo, MATERIAIS_LANCAMENTO_LINK, parametros),
+        "CEO'S 24FO (un)": ceos_24fo,
+        "CEO'S 24FO MINI (un)": ceos_24fo_mini,
+    }
+
+def _orcamento_gpon(distancia, parametros):
+    cabo = distancia * parametros["margem_cabo_gpon"]
+    return {
+        "CABO 2FO (m)": np.round(cabo, 2),
+        **quantidades_por_cabo(cabo, MATERIAIS_LANCAMENTO_GPON, parametros, arredondar_para_cima=False),
+    }
+
+@instrumentacao.instrumentado
+def comparar_cenarios(resultado, cenarios):
+    """
+    Totais das listas de materiais LINK e GPON de um arquivo (o resultado de processar_kml)
+    em cada cenário de `cenarios` (veja parametros_cenarios), uma linha por cenário. Todas
+    as rotas e POPs são calculados para todos os cenários de uma vez, com as mesmas regras
+    de criar_orcamento_lancamento_link_por_rota, criar_orcamento_fusao_link_por_rota e
+    criar_orcamento_materiais.
+    """
+    distancia_total, dados_por_pasta, coordenadas_por_pasta, cidades_coords, dados_gpon, dados_em_andamento, dados_concluido, dados_link_parceiros = resultado
+    parametros = parametros_cenarios(cenarios)
+    
+    linhas = linhas_tabela_link(dados_por_pasta, dados_em_andamento, dados_concluido)
+    distancias_link = np.array([linha[2] for linha in linhas], dtype="float64")
+    distancias_gpon = distancias_pops(dados_gpon)[1]
+    distancias_gpon = distancias_gpon[distancias_gpon > 0]
+    
+    colunas = {}
+    for prefixo, distancias, calcular in (("LINK", distancias_link, _orcamento_link), ("GPON", distancias_gpon, _orcamento_gpon)):
+        for coluna, totais in _totais_por_cenario(distancias, calcular, parametros, len(cenarios)).items():
+            colunas[f"{prefixo} - {coluna}"] = np.round(totais, 2) if totais.dtype.kind == "f" else totais
+    
+    df_cenarios = pd.DataFrame(colunas, index=cenarios.index)
+    df_cenarios.index.name = cenarios.index.name or "Cenário"
+    return df_cenarios
+
+# Splitter de cada posição da CTO na rota (1-13); as CTOs depois da 13ª não recebem splitter
+MAPEAMENTO = {
+    1: "5/95",
+    2: "5/95",
+    3: "5/95",
+    4: "5/95",
+    5: "10/90",
+    6: "10/90",
+    7: "10/90",
+    8: "10/90",
+    9: "15/85",
+    10: "20/80",
+    11: "30/70",
+    12: "40/60",
+    13: "50/50"
+}
+SPLITTERS = ("5/95", "10/90", "15/85", "20/80", "30/70", "40/60", "50/50")
+POSICOES_COM_SPLITTER = max(MAPEAMENTO)
+# Linha n: splitters de uma rota com n CTOs (n de 0 a POSICOES_COM_SPLITTER), um por tipo de SPLITTERS
+SPLITTERS_POR_QUANTIDADE_CTOS = np.cumsum(
+    [[0] * len(SPLITTERS)] + [
+        [int(MAPEAMENTO[posicao] == splitter) for splitter in SPLITTERS]
+        for posicao in range(1, POSICOES_COM_SPLITTER + 1)
+    ],
+    axis=0
+).astype("int32")
+ROTAS_POR_FITA_ACO = 2
+TUBETES_POR_CTO = 5
+
+@instrumentacao.instrumentado
+def criar_tabela_quantitativo_ctos_splitters(dados_gpon):
+    """
+    CTOs, splitters, fita de aço, fecho e tubete de cada POP com projetos de CTOs,
+    calculados para todos os POPs de uma vez: o histograma do tamanho das rotas de cada
+    POP multiplicado por SPLITTERS_POR_QUANTIDADE_CTOS dá os splitters.
+    """
+    # POP e quantidade de CTOs de cada rota
+    pops = []
+    pop_da_rota = []
+    ctos_da_rota = []
+    for nome_gpon, dados in dados_gpon.items():
+        for pop in dados.get("primeiro_nivel", []):
+            if not pop.get("ctos"):
+                continue
+            for cto in pop["ctos"]:
+                for rota in cto.get("rotas", []):
+                    pop_da_rota.append(len(pops))
+                    ctos_da_rota.append(rota["quantidade_placemarks"])
+            pops.append(pop["nome"])
+    
+    pop_da_rota = np.array(pop_da_rota, dtype=np.intp)
+    ctos_da_rota = np.array(ctos_da_rota, dtype=np.intp)
+    
+    # Histograma (POP × CTOs na rota, limitado às posições com splitter)
+    tamanhos = np.minimum(ctos_da_rota, POSICOES_COM_SPLITTER)
+    histograma = np.bincount(
+        pop_da_rota * (POSICOES_COM_SPLITTER + 1) + tamanhos,
+        minlength=len(pops) * (POSICOES_COM_SPLITTER + 1)
+    ).reshape(len(pops), POSICOES_COM_SPLITTER + 1)
+    splitters = histograma @ SPLITTERS_POR_QUANTIDADE_CTOS
+    
+    total_rotas = np.bincount(pop_da_rota, minlength=len(pops))
+    total_ctos = np.bincount(pop_da_rota, weights=ctos_da_rota, minlength=len(pops)).astype("int64")
+    
+    df = pd.DataFrame({
+        "POP": pops,
+        "CTO's": total_ctos,
+        **{f"Splitter {splitter}": splitters[:, posicao] for posicao, splitter in enumerate(SPLITTERS)},
+        # 1 fita para cada 2 rotas, arredondado para cima (mínimo 1)
+        "Fita de Aço (un)": np.maximum(1, np.ceil(total_rotas / ROTAS_POR_FITA_ACO)),
+        "Fecho (un)": total_ctos,
+        "Tubete (un)": total_ctos * TUBETES_POR_CTO,
+    })
+    
+    # Contagens em int32, numeradas pelo ID; os totais ficam à parte
+    df = df.astype({coluna: "int32" for coluna in df.columns[1:]})
+    df.index = pd.RangeIndex(1, len(df) + 1, name="ID")
+    
+    return tabela_com_total(df, "POP")
+
+
+def estilo_rota(feature):
+    propriedades = feature["properties"]
+    return {
+        "color": propriedades["cor"],
+        "weight": 4,
+        "opacity": 1.0,
+        "dashArray": "7, 7" if propriedades["tracejado"] else None
+    }
+
+@instrumentacao.instrumentado
+def criar_mapa(coordenadas_por_pasta, cidades_coords, tolerancia=0.0):
+    """
+    Monta o mapa com uma camada GeoJSON por pasta (uma FeatureCollection com todas as rotas),
+    em vez de um PolyLine por rota. Estilo e tooltip vêm das propriedades de cada feature e
+    as pastas podem ser ligadas/desligadas no controle de camadas.
+    """
+    # folium só é importado quando um mapa é montado
+    import folium
+    from folium.features import CustomIcon
+    
+    mapa = folium.Map(location=[-5.0892, -42.8016], zoom_start=simplificacao.ZOOM_INICIAL_MAPA, tiles="Esri WorldImagery")
+    
+    for nome_folder, coordenadas_folder in coordenadas_por_pasta.items():
+        features = []
+        for nome_placemark, coordinates, color, line_style, distancia, importancia in coordenadas_folder:
+            pontos = simplificacao.simplificar(coordinates, importancia, tolerancia)
+            features.append({
+                "type": "Feature",
+                "id": str(len(features)),
+                # 6 casas decimais (~0,1 m) bastam para o desenho e encurtam o HTML
+                "geometry": {"type": "LineString", "coordinates": pontos[:, ::-1].round(6).tolist()},
+                "properties": {
+                    "pasta": nome_folder,
+                    "rota": nome_placemark,
+                    "distancia": distancia,
+                    "cor": color,
+                    "tracejado": line_style == "dashed"
+                }
+            })
+        
+        if not features:
+            continue
+        
+        folium.GeoJson(
+            {"type": "FeatureCollection", "features": features},
+            name=nome_folder,
+            style_function=estilo_rota,
+            tooltip=folium.GeoJsonTooltip(
+                fields=["pasta", "rota", "distancia"],
+                aliases=["Pasta", "Rota", "Distância (metros)"]
+            )
+        ).add_to(mapa)
+    
+    if cidades_coords:
+        camada_cidades = folium.FeatureGroup(name="CIDADES")
+        for nome_cidade, coords in cidades_coords:
+            casa_icon = CustomIcon(
+                icon_image="https://fontetelecom.com.br/infraestrutura/assets/img/logo/logo-1.png",
+                icon_size=(40, 20)
+            )
+                
+            folium.Marker(
+                location=coords,
+                tooltip=nome_cidade,
+                icon=casa_icon
+            ).add_to(camada_cidades)
+        camada_cidades.add_to(mapa)
+    
+    folium.LayerControl(collapsed=False).add_to(mapa)
+    
+    return mapa
+
+@instrumentacao.instrumentado
+def html_mapa(coordenadas_por_pasta, cidades_coords, tolerancia=0.0):
+    """HTML completo (página) do mapa de criar_mapa."""
+    import folium
+    return folium.Figure().add_child(criar_mapa(coordenadas_por_pasta, cidades_coords, tolerancia)).render()
+
+# Abas do Excel, na ordem: (chave em `dados`, nome da aba, se a coluna ID vai para a aba)
+ABAS_EXCEL = [
+    ('df_tabela_final', 'LINK_Principal', True),
+    ('df_link_parceiros', 'LINK_Parceiros', True),
+    ('df_em_andamento', 'LINK_Em_Andamento', False),
+    ('df_concluido', 'LINK_Concluido', False),
+    ('df_orcamento_link', 'Orcamento_Lancamento_Link', False),
+    ('df_orcamento_fusao', 'Orcamento_Fusao_Link', False),
+    ('df_dashboard_gpon', 'GPON_Dashboard', False),
+    ('df_orcamento_gpon', 'Orcamento_Lancamento_GPON', False),
+    ('df_splitters', 'Orcamento_Fusao_GPON', False),
+]
+TITULO_DASHBOARD_GPON = "GPON - Análise Rotas, CTO'S, Fibra Ótica"
+# Larguras fixas das colunas do dashboard GPON (POP, Rotas, CTO'S, Fibra Ótica)
+LARGURAS_DASHBOARD_GPON = [25, 10, 10, 18]
+FORMATO_INTEIRO = '#,##0'
+FORMATO_DECIMAL = '#,##0.00'
+# Linhas lidas de cada coluna para estimar a largura
+AMOSTRA_LARGURA = 1000
+LARGURA_MAXIMA = 50
+
+class _Estilos:
+    """Formatos do xlsxwriter criados uma vez por combinação de propriedades."""
+    def __init__(self, workbook):
+        self.workbook = workbook
+        self._formatos = {}
+    
+    def __call__(self, **propriedades):
+        propriedades = {chave: valor for chave, valor in propriedades.items() if valor is not None}
+        if not propriedades:
+            return None
+        chave = tuple(sorted(propriedades.items()))
+        if chave not in self._formatos:
+            self._formatos[chave] = self.workbook.add_format(propriedades)
+        return self._formatos[chave]
+
+def _formato_numerico(coluna):
+    tipo = pd.api.types.infer_dtype(coluna, skipna=True)
+    if tipo == "integer":
+        return FORMATO_INTEIRO
+    if tipo in ("floating", "mixed-integer-float"):
+        return FORMATO_DECIMAL
+    return None
+
+def _largura(nome, coluna, total=""):
+    amostra = coluna.iloc[:AMOSTRA_LARGURA].astype(str).str.len()
+    maior = max(int(amostra.max()) if len(amostra) else 0, len(str(total)))
+    return min(LARGURA_MAXIMA, max(len(str(nome)), maior) + 2)
+
+def _escrever_linha(worksheet, linha, registro, formatos=None):
+    for posicao, valor in enumerate(registro):
+        if valor is None or valor != valor or valor == "":
+            continue
+        formato = formatos[posicao] if formatos else None
+        if isinstance(valor, str):
+            worksheet.write_string(linha, posicao, valor, formato)
+        else:
+            worksheet.write(linha, posicao, valor, formato)
+
+def _escrever_aba(workbook, estilos, nome_aba, df, total=None, titulo=None, larguras=None, cabecalho=None):
+    """
+    Grava `df` (sem o índice) em uma aba nova, linha a linha, e depois a linha `total`
+    (um valor por coluna), em negrito. Os formatos numéricos e as larguras são definidos
+    por coluna.
+    """
+    worksheet = workbook.add_worksheet(nome_aba)
+    colunas = list(df.columns)
+    total = [total.get(coluna, "") for coluna in colunas] if total is not None else None
+    formatos = [_formato_numerico(df[coluna]) for coluna in colunas]
+    larguras = larguras or [
+        _largura(coluna, df[coluna], total[posicao] if total else "") for posicao, coluna in enumerate(colunas)
+    ]
+    
+    # No modo constant_memory as colunas precisam ser configuradas antes das linhas
+    for posicao, (largura, formato) in enumerate(zip(larguras, formatos)):
+        worksheet.set_column(posicao, posicao, largura, estilos(num_format=formato))
+    
+    linha = 0
+    if titulo:
+        worksheet.merge_range(0, 0, 0, len(colunas) - 1, titulo, estilos(bold=True, font_size=14, align='center'))
+        linha = 1
+    
+    formato_cabecalho = cabecalho or estilos(bold=True, border=1, align='center', valign='top')
+    worksheet.write_row(linha, 0, [str(coluna) for coluna in colunas], formato_cabecalho)
+    linha += 1
+    
+    valores = zip(*(df[coluna].tolist() for coluna in colunas)) if colunas else iter(())
+    for posicao, registro in enumerate(valores, start=linha):
+        _escrever_linha(worksheet, posicao, registro)
+    
+    if total is not None:
+        formatos_total = [estilos(bold=True, top=1, num_format=formato) for formato in formatos]
+        _escrever_linha(worksheet, linha + len(df), total, formatos_total)
+    return worksheet
+
+@instrumentacao.instrumentado
+def exportar_para_excel(dados):
+    """
+    Exporta todas as tabelas para um arquivo Excel com múltiplas abas (ABAS_EXCEL).
+    As linhas são gravadas em sequência no modo constant_memory do xlsxwriter, que
+    descarrega cada linha ao passar para a seguinte; a memória usada pelo arquivo fica
+    limitada, independentemente do tamanho das tabelas. Os índices não são exportados e
+    a linha de total das tabelas TabelaComTotal é gravada depois dos dados.
+    """
+    import xlsxwriter
+    
+    output = BytesIO()
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    estilos = _Estilos(workbook)
+    
+    for chave, nome_aba, com_id in ABAS_EXCEL:
+        tabela = dados.get(chave)
+        if tabela is None:
+            continue
+        df, total = separar_total(tabela)
+        if df.empty and total is None:
+            continue
+        df = df.reset_index(drop=True)
+        if not com_id:
+            df = df.drop(columns=['ID'], errors='ignore')
+        
+        if chave == 'df_dashboard_gpon':
+            colunas_fixas = len(LARGURAS_DASHBOARD_GPON)
+            larguras = LARGURAS_DASHBOARD_GPON if len(df.columns) == colunas_fixas else None
+            cabecalho = estilos(bold=True, fg_color='#4472C4', font_color='white', border=1, align='center')
+            _escrever_aba(workbook, estilos, nome_aba, df, total, TITULO_DASHBOARD_GPON, larguras, cabecalho)
+        else:
+            _escrever_aba(workbook, estilos, nome_aba, df, total)
+    
+    workbook.close()
+    output.seek(0)
+    return output
+
+def linhas_tabela_link(dados_por_pasta, dados_em_andamento, dados_concluido):
+    """Linhas [Pasta, Rota, Distância] de todas as rotas LINK, na ordem da tabela principal."""
+    dados_tabela_pastas = []
+    
+    for nome_folder, (distancia_folder, dados) in dados_por_pasta.items():
+        for linha in dados:
+            dados_tabela_pastas.append([nome_folder, linha[1], linha[2]])
+    
+    for linha in dados_em_andamento:
+        dados_tabela_pastas.append([linha[0], linha[1], linha[2]])
+    
+    for linha in dados_concluido:
+        dados_tabela_pastas.append([linha[0], linha[1], linha[2]])
+    
+    return dados_tabela_pastas
+
+def juntar_tabelas_por_arquivo(tabelas):
+    """
+    Junta as tabelas (TabelaComTotal) de vários arquivos, uma (nome do arquivo, tabela) por
+    arquivo, com a coluna "Arquivo" na frente. O total é recalculado sobre todas as linhas.
+    """
+    partes = []
+    for nome_arquivo, tabela in tabelas:
+        if tabela is None or tabela.dados.empty:
+            continue
+        df = tabela.dados.reset_index(drop=True)
+        df.insert(0, "Arquivo", nome_arquivo)
+        partes.append(df)
+    
+    if not partes:
+        return None
+    
+    df_lote = pd.concat(partes, ignore_index=True)
+    df_lote.index = pd.RangeIndex(1, len(df_lote) + 1, name="ID")
+    return tabela_com_total(df_lote, "Arquivo")
+
+def tabela_rotas(linhas):
+    """Tabela [Pasta, Rota, Distância] com a coluna ID, como exportada nas abas de status."""
+    df_rotas = pd.DataFrame(linhas, columns=["Pasta", "Rota", "Distância (m)"])
+    df_rotas.insert(0, "ID", range(1, len(df_rotas) + 1))
+    return df_rotas
+
+def tabela_agrupada(df_rotas, colunas_grupo, coluna_rotulo, coluna_valor="Distância (m)", ordenar=True):
+    """
+    Relatório agrupado de `df_rotas` (TabelaComTotal): as linhas de detalhe e o subtotal de
+    cada grupo (`colunas_grupo`, com "Subtotal" em `coluna_rotulo`), indexados pelo ID das
+    linhas de detalhe (vazio nos subtotais), e o total geral ("Total" na primeira coluna
+    do grupo). Os subtotais seguem a ordem dos grupos ou, com `ordenar=False`, a da
+    primeira aparição.
+    """
+    colunas_grupo = list(colunas_grupo)
+    colunas = colunas_grupo + [coluna_rotulo, coluna_valor]
+    detalhes = df_rotas[colunas]
+    
+    subtotais = detalhes.groupby(colunas_grupo, sort=ordenar)[coluna_valor].sum().reset_index()
+    subtotais.insert(len(colunas_grupo), coluna_rotulo, "Subtotal")
+    
+    total_row = {coluna: "" for coluna in colunas}
+    total_row[colunas_grupo[0]] = "Total"
+    total_row[coluna_valor] = detalhes[coluna_valor].sum()
+    
+    df_tabela = pd.concat([detalhes, subtotais], ignore_index=True)
+    ids = np.full(len(df_tabela), "", dtype=object)
+    ids[:len(detalhes)] = np.arange(1, len(detalhes) + 1)
+    df_tabela.index = pd.Index(ids, name="ID")
+    return TabelaComTotal(df_tabela, total_row)
+
+def tabela_com_subtotais(linhas, coluna_rota="Rota"):
+    """
+    Tabela das rotas ([Pasta, Rota, Distância]) seguida do subtotal de cada pasta, indexada
+    pelo ID da rota, com o total geral à parte (TabelaComTotal).
+    """
+    df_rotas = pd.DataFrame(linhas, columns=["Pasta", coluna_rota, "Distância (m)"])
+    return tabela_agrupada(df_rotas, ["Pasta"], coluna_rota)
+
+@instrumentacao.instrumentado
+def tabelas_rotas_relatorio(resultado):
+    """Tabelas LINK e dashboard GPON de um arquivo (o resultado de processar_kml)."""
+    distancia_total, dados_por_pasta, coordenadas_por_pasta, cidades_coords, dados_gpon, dados_em_andamento, dados_concluido, dados_link_parceiros = resultado
+    tabelas = {}
+    
+    if dados_link_parceiros:
+        tabelas['df_link_parceiros'] = tabela_rotas(dados_link_parceiros)
+    
+    dados_tabela_pastas = linhas_tabela_link(dados_por_pasta, dados_em_andamento, dados_concluido)
+    tabelas['df_tabela_final'] = tabela_com_subtotais(dados_tabela_pastas, "ROTAS LINK")
+    
+    if dados_em_andamento:
+        tabelas['df_em_andamento'] = tabela_rotas(dados_em_andamento)
+    
+    if dados_concluido:
+        tabelas['df_concluido'] = tabela_rotas(dados_concluido)
+    
+    df_dashboard = tabela_dashboard_gpon(dados_gpon)
+    if df_dashboard is not None:
+        tabelas['df_dashboard_gpon'] = df_dashboard
+    
+    return tabelas
+
+@instrumentacao.instrumentado
+def orcamentos_relatorio(resultado):
+    """Listas de materiais LINK e GPON de um arquivo (o resultado de processar_kml)."""
+    distancia_total, dados_por_pasta, coordenadas_por_pasta, cidades_coords, dados_gpon, dados_em_andamento, dados_concluido, dados_link_parceiros = resultado
+    tabelas = {}
+    
+    dados_tabela_pastas = linhas_tabela_link(dados_por_pasta, dados_em_andamento, dados_concluido)
+    df_tabela_pastas = pd.DataFrame(dados_tabela_pastas, columns=["Pasta", "ROTAS LINK", "Distância (m)"])
+    if not df_tabela_pastas.empty:
+        tabelas['df_orcamento_link'] = criar_orcamento_lancamento_link_por_rota(df_tabela_pastas)
+        tabelas['df_orcamento_fusao'] = criar_orcamento_fusao_link_por_rota(df_tabela_pastas)
+    
+    if dados_gpon:
+        tabelas['df_orcamento_gpon'] = criar_orcamento_materiais(dados_gpon)
+        tabelas['df_splitters'] = criar_tabela_quantitativo_ctos_splitters(dados_gpon)
+    
+    return tabelas
+
+def tabelas_relatorio(resultado):
+    """
+    Tabelas do relatório de um arquivo (o resultado de processar_kml), com as chaves
+    usadas por exportar_para_excel. As tabelas sem dados ficam de fora.
+    """
+    return {**tabelas_rotas_relatorio(resultado), **orcamentos_relatorio(resultado)}
+
+@instrumentacao.instrumentado
+def tabelas_relatorio_lote(resultados):
+    """
+    Relatório consolidado de vários arquivos, uma tupla (nome do arquivo, documento,
+    resultado de processar_kml) por arquivo: tabela LINK, dashboard GPON e listas de
+    materiais, com a coluna "Arquivo" indicando a origem de cada linha. Usa as mesmas
+    chaves do relatório de um arquivo.
+    """
+    linhas_link = []
+    tabelas_rotas = []
+    tabelas_gpon = []
+    for nome_arquivo, documento, (distancia_total, dados_por_pasta, coordenadas_por_pasta, cidades_coords, dados_gpon, dados_em_andamento, dados_concluido, dados_link_parceiros) in resultados:
+        linhas = linhas_tabela_link(dados_por_pasta, dados_em_andamento, dados_concluido)
+        linhas_link.extend([nome_arquivo] + linha for linha in linhas)
+        tabelas_rotas.append((nome_arquivo, pd.DataFrame(linhas, columns=["Pasta", "ROTAS LINK", "Distância (m)"])))
+        tabelas_gpon.append((nome_arquivo, dados_gpon))
+    
+    tabelas = {}
+    
+    df_rotas = pd.DataFrame(linhas_link, columns=["Arquivo", "Pasta", "ROTAS LINK", "Distância (m)"])
+    if not df_rotas.empty:
+        tabelas['df_tabela_final'] = tabela_agrupada(df_rotas, ["Arquivo", "Pasta"], "ROTAS LINK", ordenar=False)
+    
+    juntas = [
+        ('df_dashboard_gpon', [(nome, tabela_dashboard_gpon(dados_gpon)) for nome, dados_gpon in tabelas_gpon]),
+        ('df_orcamento_link',
+         [(nome, criar_orcamento_lancamento_link_por_rota(df)) for nome, df in tabelas_rotas if not df.empty]),
+        ('df_orcamento_fusao',
+         [(nome, criar_orcamento_fusao_link_por_rota(df)) for nome, df in tabelas_rotas if not df.empty]),
+        ('df_orcamento_gpon',
+         [(nome, criar_orcamento_materiais(dados_gpon)) for nome, dados_gpon in tabelas_gpon if dados_gpon]),
+        ('df_splitters',
+         [(nome, criar_tabela_quantitativo_ctos_splitters(dados_gpon)) for nome, dados_gpon in tabelas_gpon if dados_gpon]),
+    ]
+    for chave, tabelas_arquivos in juntas:
+        tabela_junta = juntar_tabelas_por_arquivo(tabelas_arquivos)
+        if tabela_junta is not None:
+            tabelas[chave] = tabela_junta
+    
+    return tabelas
+
+def tabelas_para_json(tabelas):
+    """Cada tabela como uma lista de registros (um dicionário por linha), pronta para json.dump."""
+    registros = {}
+    for chave, tabela in tabelas.items():
+        df = com_total(tabela)
+        # O índice só vira coluna quando é o ID; os demais são posições
+        df = df.reset_index(drop=df.index.name is None)
+        registros[chave] = json.loads(df.to_json(orient="records", force_ascii=False))
+    return registros
+
+def salvar_relatorio(tabelas, destino, formato="excel"):
+    """Grava as tabelas em `destino`.xlsx e/ou `destino`.json e devolve os caminhos gerados."""
+    gerados = []
+    
+    if formato in ("excel", "ambos"):
+        caminho = destino + ".xlsx"
+        with open(caminho, "wb") as arquivo:
+            arquivo.write(exportar_para_excel(tabelas).getbuffer())
+        gerados.append(caminho)
+    
+    if formato in ("json", "ambos"):
+        caminho = destino + ".json"
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            json.dump(tabelas_para_json(tabelas), arquivo, ensure_ascii=False, indent=2)
+        gerados.append(caminho)
+    
+    return gerados
+
+@instrumentacao.instrumentado
+def processar_arquivos(caminhos, processos=None):
+    """
+    Lê, mede e processa os arquivos KML/KMZ em `caminhos`, um arquivo por processo.
+    Devolve, na mesma ordem, (nome do arquivo, documento, resultado de processar_kml)
+    para cada arquivo, ou a exceção que ele gerou (arquivo ausente ou inválido).
+    """
+    resultados = [None] * len(caminhos)
+    pendentes = []
+    for posicao, caminho in enumerate(caminhos):
+        try:
+            with open(caminho, "rb") as arquivo:
+                pendentes.append((posicao, arquivo.read()))
+        except OSError as erro:
+            resultados[posicao] = erro
+    
+    with instrumentacao.medir_etapa("ler_e_medir_arquivos", arquivos=len(pendentes)):
+        lidos = processamento_paralelo.ler_e_medir_arquivos([conteudo for _, conteudo in pendentes], processos)
+    for (posicao, _), lido in zip(pendentes, lidos):
+        if isinstance(lido, Exception):
+            resultados[posicao] = lido
+            continue
+        documento, medidas = lido
+        resultados[posicao] = (os.path.basename(caminhos[posicao]), documento, processar_kml(documento, medidas=medidas))
+    
+    return resultados
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="analisador_kml",
+        description="Gera os relatórios (Excel e/ou JSON) de projetos de fibra ótica a partir de arquivos KML ou KMZ."
+    )
+    parser.add_argument("arquivos", nargs="+", help="arquivos .kml ou .kmz")
+    parser.add_argument("-s", "--saida", default=".", help="pasta onde os relatórios são gravados (padrão: pasta atual)")
+    parser.add_argument("-f", "--formato", choices=FORMATOS, default="excel", help="formato dos relatórios (padrão: excel)")
+    parser.add_argument("-c", "--consolidado", metavar="NOME",
+                        help="grava também um relatório consolidado de todos os arquivos, com este nome")
+    parser.add_argument("-p", "--processos", type=int, default=None,
+                        help="quantidade de processos (padrão: KML_PROCESSOS ou o número de CPUs)")
+    parser.add_argument("--log-etapas", nargs="?", const="stderr", metavar="ARQUIVO",
+                        help="grava o tempo e a memória de cada etapa em linhas JSON (padrão: saída de erros)")
+    parser.add_argument("--medir-memoria", action="store_true",
+                        help="mede o pico de memória de cada etapa (tracemalloc; deixa o processamento mais lento)")
+    args = parser.parse_args(argv)
+    
+    if args.log_etapas:
+        instrumentacao.configurar_log(args.log_etapas)
+    if args.medir_memoria:
+        instrumentacao.ativar_memoria(True)
+    
+    os.makedirs(args.saida, exist_ok=True)
+    processos = processamento_paralelo.PROCESSOS if args.processos is None else args.processos
+    
+    # Um bloco de arquivos por vez, para não manter todos os documentos em memória
+    # (a não ser que o consolidado precise deles)
+    bloco = max(1, processos)
+    resultados_lote = []
+    falhas = 0
+    for inicio in range(0, len(args.arquivos), bloco):
+        caminhos = args.arquivos[inicio:inicio + bloco]
+        for caminho, resultado in zip(caminhos, processar_arquivos(caminhos, processos)):
+            if isinstance(resultado, Exception):
+                print(f"{caminho}: {resultado}", file=sys.stderr)
+                falhas += 1
+                continue
+            
+            destino = os.path.join(args.saida, os.path.splitext(os.path.basename(caminho))[0])
+            gerados = salvar_relatorio(tabelas_relatorio(resultado[2]), destino, args.formato)
+            print(f"{caminho} -> {', '.join(gerados)}")
+            
+            if args.consolidado:
+                resultados_lote.append(resultado)
+    
+    if args.consolidado and resultados_lote:
+        destino = os.path.join(args.saida, args.consolidado)
+        gerados = salvar_relatorio(tabelas_relatorio_lote(resultados_lote), destino, args.formato)
+        print(f"consolidado ({len(resultados_lote)} arquivos) -> {', '.join(gerados)}")
+    
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Gerador de arquivos KML sintéticos para os benchmarks.
+
+Os arquivos seguem as convenções de pastas que o analisador reconhece:
+
+    CIDADES                      pontos das cidades
+    LINK <cidade>                rotas de backbone, nas subpastas
+        ROTAS                    ... sem status
+        EM ANDAMENTO             ... em andamento (tracejadas no mapa)
+        CONCLUÍDO                ... concluídas
+    LINK PARCEIROS               rotas de parceiros
+    GPON
+        POP <n>                  um POP por subpasta de primeiro nível
+            CABOS                cabos de distribuição (LineStrings)
+            CTO'S POP <n>        projetos de CTOs
+                ROTA <r>         uma rota por subpasta, com 1 a 16 CTOs (pontos)
+
+O total de vértices das LineStrings é o tamanho pedido (60% em LINK, 10% em
+LINK PARCEIROS, 30% em GPON), com as coordenadas em passeios aleatórios pela
+região Nordeste. A mesma semente gera sempre o mesmo arquivo.
+
+    python benchmarks/kml_sintetico.py 100000 -o sintetico_100k.kml
+"""
+import argparse
+import sys
+
+import numpy as np
+
+NAMESPACE = "http://www.opengis.net/kml/2.2"
+
+# Vértices por LineString em cada tipo de pasta
+VERTICES_ROTA_LINK = 500
+VERTICES_CABO_GPON = 80
+# Rotas de cada pasta LINK e cabos de cada POP
+ROTAS_POR_LINK = 12
+CABOS_POR_POP = 10
+ROTAS_CTO_POR_POP = 6
+MAX_CTOS_POR_ROTA = 16
+
+FRACAO_LINK = 0.6
+FRACAO_PARCEIROS = 0.1
+
+ESTILOS = {"verde": "ff00ff00", "amarelo": "ff00ffff", "vermelho": "ff0000ff"}
+
+# Passo do passeio aleatório (graus, ~50 m) e área de partida das linhas
+PASSO_GRAUS = 0.0005
+LATITUDES = (-10.0, -3.0)
+LONGITUDES = (-45.0, -35.0)
+
+
+def _tamanhos(vertices, por_linha):
+    """Divide `vertices` em linhas de `por_linha` vértices (a última com o resto, mínimo 2)."""
+    if vertices < 2:
+        return []
+    quantidade, resto = divmod(vertices, por_linha)
+    tamanhos = [por_linha] * quantidade
+    if resto >= 2:
+        tamanhos.append(resto)
+    elif resto and tamanhos:
+        tamanhos[-1] += resto
+    return tamanhos or [vertices]
+
+
+def _coordenadas(aleatorio, quantidade):
+    """Texto do <coordinates> de uma linha com `quantidade` vértices (lon,lat,alt)."""
+    inicio = np.array([aleatorio.uniform(*LONGITUDES), aleatorio.uniform(*LATITUDES)])
+    passos = aleatorio.normal(0.0, PASSO_GRAUS, size=(quantidade, 2))
+    passos[0] = 0.0
+    pontos = inicio + np.cumsum(passos, axis=0)
+    return " ".join(f"{lon:.6f},{lat:.6f},0" for lon, lat in pontos.tolist())
+
+
+def _linha(aleatorio, nome, quantidade, estilo=None):
+    estilo = f"<styleUrl>#{estilo}</styleUrl>" if estilo else ""
+    return (f"<Placemark><name>{nome}</name>{estilo}<LineString><coordinates>"
+            f"{_coordenadas(aleatorio, quantidade)}</coordinates></LineString></Placemark>")
+
+
+def _ponto(aleatorio, nome):
+    lon, lat = aleatorio.uniform(*LONGITUDES), aleatorio.uniform(*LATITUDES)
+    return f"<Placemark><name>{nome}</name><Point><coordinates>{lon:.6f},{lat:.6f},0</coordinates></Point></Placemark>"
+
+
+def _pasta(nome, conteudo):
+    return f"<Folder><name>{nome}</name>{''.join(conteudo)}</Folder>"
+
+
+def gerar_kml(vertices, semente=0):
+    """Conteúdo (bytes, UTF-8) de um KML sintético com cerca de `vertices` vértices."""
+    aleatorio = np.random.default_rng(semente)
+    vertices_link = int(vertices * FRACAO_LINK)
+    vertices_parceiros = int(vertices * FRACAO_PARCEIROS)
+    vertices_gpon = vertices - vertices_link - vertices_parceiros
+
+    partes = [f'<?xml version="1.0" encoding="UTF-8"?><kml xmlns="{NAMESPACE}"><Document><name>Sintético {vertices}</name>']
+    for estilo, cor in ESTILOS.items():
+        partes.append(f'<Style id="{estilo}"><LineStyle><color>{cor}</color><width>3</width></LineStyle></Style>')
+
+    # LINK: grupos de ROTAS_POR_LINK rotas, divididas entre as subpastas de status
+    rotas_link = _tamanhos(vertices_link, VERTICES_ROTA_LINK)
+    pastas_link = [rotas_link[inicio:inicio + ROTAS_POR_LINK] for inicio in range(0, len(rotas_link), ROTAS_POR_LINK)]
+    partes.append(_pasta("CIDADES", [_ponto(aleatorio, f"Cidade {n}") for n in range(len(pastas_link) + 1)]))
+    for n, tamanhos in enumerate(pastas_link):
+        subpastas = {"ROTAS": [], "EM ANDAMENTO": [], "CONCLUÍDO": []}
+        for r, tamanho in enumerate(tamanhos):
+            subpasta = ("ROTAS", "ROTAS", "ROTAS", "EM ANDAMENTO", "CONCLUÍDO")[r % 5]
+            estilo = list(ESTILOS)[r % len(ESTILOS)] if r % 2 else None
+            subpastas[subpasta].append(_linha(aleatorio, f"ROTA {n}-{r}", tamanho, estilo))
+        partes.append(_pasta(f"LINK CIDADE {n}", [_pasta(nome, linhas) for nome, linhas in subpastas.items() if linhas]))
+
+    rotas_parceiros = _tamanhos(vertices_parceiros, VERTICES_ROTA_LINK)
+    if rotas_parceiros:
+        partes.append(_pasta("LINK PARCEIROS", [
+            _linha(aleatorio, f"PARCEIRO {r}", tamanho) for r, tamanho in enumerate(rotas_parceiros)
+        ]))
+
+    # GPON: um POP a cada CABOS_POR_POP cabos, com os seus projetos de CTOs
+    cabos = _tamanhos(vertices_gpon, VERTICES_CABO_GPON)
+    pops = []
+    for p, inicio in enumerate(range(0, len(cabos), CABOS_POR_POP)):
+        rotas_cto = [
+            _pasta(f"ROTA {r}", [_ponto(aleatorio, f"CTO {p}-{r}-{c}")
+                                 for c in range(int(aleatorio.integers(1, MAX_CTOS_POR_ROTA + 1)))])
+            for r in range(ROTAS_CTO_POR_POP)
+        ]
+        pops.append(_pasta(f"POP {p}", [
+            _pasta("CABOS", [_linha(aleatorio, f"CABO {p}-{c}", tamanho)
+                             for c, tamanho in enumerate(cabos[inicio:inicio + CABOS_POR_POP])]),
+            _pasta(f"CTO'S POP {p}", rotas_cto),
+        ]))
+    if pops:
+        partes.append(_pasta("GPON", pops))
+
+    partes.append("</Document></kml>")
+    return "".join(partes).encode("utf-8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera um KML sintético com as pastas LINK, GPON e CIDADES.")
+    parser.add_argument("vertices", type=int, help="total de vértices das LineStrings")
+    parser.add_argument("-o", "--saida", help="arquivo de saída (padrão: saída padrão)")
+    parser.add_argument("--semente", type=int, default=0, help="semente do gerador (padrão: 0)")
+    args = parser.parse_args(argv)
+
+    conteudo = gerar_kml(args.vertices, args.semente)
+    if args.saida:
+        with open(args.saida, "wb") as arquivo:
+            arquivo.write(conteudo)
+    else:
+        sys.stdout.buffer.write(conteudo)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Benchmark por etapa do analisador, com arquivos KML sintéticos (kml_sintetico).
+
+Para cada tamanho (total de vértices), gera o arquivo e mede, separadamente:
+
+    leitura               leitor_kml.ler_kml
+    processar_kml         medição das linhas e montagem dos dados por pasta
+    tabelas               tabelas LINK e dashboard GPON
+    orcamentos            listas de materiais LINK e GPON
+    mapa                  montagem do mapa e geração do HTML (nível de detalhe padrão)
+    exportar_para_excel   arquivo Excel com todas as tabelas
+
+Antes das medições, um arquivo pequeno passa por todas as etapas para que as
+importações e inicializações (folium, xlsxwriter) não entrem nos tempos. Cada
+etapa é repetida `--repeticoes` vezes (o cache de distâncias é limpo antes de
+cada medição) e o resultado, com a mediana e o mínimo, vai em JSON para a
+saída padrão ou para `--saida`; o resumo legível vai para a saída de erros.
+Com `--comparar`, os mínimos são comparados aos de um resultado anterior e o
+script termina com status 1 se alguma etapa ficar mais lenta que a tolerância
+(diferenças abaixo de DIFERENCA_MINIMA_S são consideradas ruído).
+
+    python benchmarks/medir_etapas.py --tamanhos 1k 10k 100k 1M --saida resultado.json
+    python benchmarks/medir_etapas.py --comparar resultado.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from io import BytesIO
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import numpy as np
+import pandas as pd
+
+import analisador_kml
+import geodesia
+import leitor_kml
+import simplificacao
+from kml_sintetico import gerar_kml
+
+TAMANHOS_PADRAO = ("1k", "10k", "100k", "1M")
+ETAPAS = ("leitura", "processar_kml", "tabelas", "orcamentos", "mapa", "exportar_para_excel")
+SUFIXOS = {"k": 1_000, "m": 1_000_000}
+# Vértices do arquivo de aquecimento
+VERTICES_AQUECIMENTO = 1_000
+DIFERENCA_MINIMA_S = 0.005
+
+
+def tamanho(texto):
+    """'1k' -> 1000, '2.5M' -> 2500000, '300' -> 300."""
+    sufixo = texto[-1:].lower()
+    if sufixo in SUFIXOS:
+        return int(float(texto[:-1]) * SUFIXOS[sufixo])
+    return int(texto)
+
+
+def medir_pipeline(conteudo, etapas, processos):
+    """Executa todas as etapas uma vez e devolve os segundos de cada uma das pedidas."""
+    tempos = {}
+
+    def cronometrar(etapa, funcao, *argumentos):
+        inicio = time.perf_counter()
+        retorno = funcao(*argumentos)
+        if etapa in etapas:
+            tempos[etapa] = time.perf_counter() - inicio
+        return retorno
+
+    documento = cronometrar("leitura", leitor_kml.ler_kml, BytesIO(conteudo))
+    geodesia.limpar_cache_distancias()
+    resultado = cronometrar("processar_kml", analisador_kml.processar_kml, documento, processos)
+    tabelas = cronometrar("tabelas", analisador_kml.tabelas_rotas_relatorio, resultado)
+    tabelas.update(cronometrar("orcamentos", analisador_kml.orcamentos_relatorio, resultado))
+    if "mapa" in etapas:
+        cronometrar("mapa", analisador_kml.html_mapa, resultado[2], resultado[3],
+                    simplificacao.NIVEIS_DETALHE[simplificacao.NIVEL_PADRAO])
+    if "exportar_para_excel" in etapas:
+        cronometrar("exportar_para_excel", analisador_kml.exportar_para_excel, tabelas)
+    return tempos
+
+
+def metadados(processos, repeticoes):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "processos": processos,
+        "repeticoes": repeticoes,
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def comparar(resultados, base, tolerancia):
+    """Linhas do relatório de comparação e se alguma etapa passou da tolerância."""
+    anteriores = {(r["vertices"], r["etapa"]): r["minimo_s"] for r in base["resultados"]}
+    linhas, regressao = [], False
+    for resultado in resultados:
+        anterior = anteriores.get((resultado["vertices"], resultado["etapa"]))
+        if not anterior:
+            continue
+        razao = resultado["minimo_s"] / anterior
+        pior = razao > 1 + tolerancia and resultado["minimo_s"] - anterior > DIFERENCA_MINIMA_S
+        regressao |= pior
+        linhas.append(f"{resultado['vertices']:>9} {resultado['etapa']:20s} {anterior:9.4f} -> "
+                      f"{resultado['minimo_s']:9.4f} s  x{razao:.2f}{'  REGRESSÃO' if pior else ''}")
+    return linhas, regressao
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark por etapa com arquivos KML sintéticos.")
+    parser.add_argument("--tamanhos", nargs="+", type=tamanho, default=[tamanho(t) for t in TAMANHOS_PADRAO],
+                        help="totais de vértices, aceitando os sufixos k e M (padrão: 1k 10k 100k 1M)")
+    parser.add_argument("--etapas", nargs="+", choices=ETAPAS, default=list(ETAPAS), help="etapas medidas (padrão: todas)")
+    parser.add_argument("--repeticoes", type=int, default=3, help="medições por etapa (padrão: 3)")
+    parser.add_argument("--processos", type=int, default=1,
+                        help="processos na medição das linhas (padrão: 1, para resultados comparáveis)")
+    parser.add_argument("--semente", type=int, default=0, help="semente dos arquivos sintéticos")
+    parser.add_argument("--saida", help="arquivo JSON do resultado (padrão: saída padrão)")
+    parser.add_argument("--comparar", metavar="BASE", help="resultado anterior (JSON) para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="aumento relativo do mínimo aceito em --comparar (padrão: 0.25)")
+    args = parser.parse_args(argv)
+
+    medir_pipeline(gerar_kml(VERTICES_AQUECIMENTO, args.semente), args.etapas, args.processos)
+
+    resultados = []
+    for vertices in args.tamanhos:
+        conteudo = gerar_kml(vertices, args.semente)
+        medidas = {etapa: [] for etapa in args.etapas}
+        for _ in range(args.repeticoes):
+            for etapa, segundos in medir_pipeline(conteudo, args.etapas, args.processos).items():
+                medidas[etapa].append(segundos)
+
+        for etapa in args.etapas:
+            resultados.append({
+                "vertices": vertices,
+                "bytes_kml": len(conteudo),
+                "etapa": etapa,
+                "mediana_s": round(statistics.median(medidas[etapa]), 6),
+                "minimo_s": round(min(medidas[etapa]), 6),
+                "medidas_s": [round(segundos, 6) for segundos in medidas[etapa]],
+            })
+            print(f"{vertices:>9} {etapa:20s} mediana {resultados[-1]['mediana_s']:9.4f} s  "
+                  f"mínimo {resultados[-1]['minimo_s']:9.4f} s", file=sys.stderr)
+
+    saida = {"metadados": metadados(args.processos, args.repeticoes), "resultados": resultados}
+    texto = json.dumps(saida, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto + "\n")
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            linhas, regressao = comparar(resultados, json.load(arquivo), args.tolerancia)
+        print("\n".join(linhas), file=sys.stderr)
+        return 1 if regressao else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
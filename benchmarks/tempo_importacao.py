@@ -0,0 +1,113 @@
+"""
+Tempo de importação a frio do aplicativo, com um orçamento.
+
+Cada rodada executa, em um interpretador novo, as importações do topo de
+projetos_kml1.1.py (o que todo início do aplicativo paga antes de qualquer
+arquivo ser enviado) e, separadamente, a do núcleo analisador_kml (o que a
+linha de comando paga). A mediana das rodadas é comparada ao orçamento e o
+script termina com status 1 se algum orçamento for ultrapassado ou se uma
+dependência pesada (folium, plotly.express, xlsxwriter) for carregada já na
+importação.
+
+    python benchmarks/tempo_importacao.py
+    python benchmarks/tempo_importacao.py --rodadas 9 --orcamento-app 1.2 --json
+
+Os orçamentos padrão também podem ser definidos pelas variáveis
+KML_ORCAMENTO_IMPORTACAO_APP e KML_ORCAMENTO_IMPORTACAO_NUCLEO (segundos).
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_APP = os.path.join(RAIZ, "projetos_kml1.1.py")
+
+ORCAMENTO_APP = float(os.environ.get("KML_ORCAMENTO_IMPORTACAO_APP", "1.5"))
+ORCAMENTO_NUCLEO = float(os.environ.get("KML_ORCAMENTO_IMPORTACAO_NUCLEO", "1.0"))
+
+# Carregadas só quando a seção que as usa é exibida
+PESADOS = ("folium", "plotly.express", "xlsxwriter")
+
+MEDIDOR = """
+import time
+_inicio = time.perf_counter()
+{importacoes}
+_segundos = time.perf_counter() - _inicio
+import json, sys
+print(json.dumps({{"segundos": _segundos, "pesados": [m for m in {pesados!r} if m in sys.modules]}}))
+"""
+
+
+def importacoes_do_topo(caminho):
+    """Código com as instruções import do nível superior do módulo, na ordem em que aparecem."""
+    with open(caminho, encoding="utf-8") as arquivo:
+        arvore = ast.parse(arquivo.read(), caminho)
+    return "\n".join(
+        ast.unparse(no) for no in arvore.body if isinstance(no, (ast.Import, ast.ImportFrom))
+    )
+
+
+def medir(importacoes, rodadas):
+    """Tempos (segundos) de `rodadas` importações a frio e os módulos pesados carregados."""
+    codigo = MEDIDOR.format(importacoes=importacoes, pesados=PESADOS)
+    tempos = []
+    pesados = set()
+    for _ in range(rodadas):
+        saida = subprocess.run(
+            [sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout
+        medida = json.loads(saida.strip().splitlines()[-1])
+        tempos.append(medida["segundos"])
+        pesados.update(medida["pesados"])
+    return tempos, sorted(pesados)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo de importação a frio do aplicativo e do núcleo.")
+    parser.add_argument("--rodadas", type=int, default=5, help="interpretadores novos por alvo (padrão: 5)")
+    parser.add_argument("--orcamento-app", type=float, default=ORCAMENTO_APP,
+                        help=f"mediana máxima do aplicativo, em segundos (padrão: {ORCAMENTO_APP})")
+    parser.add_argument("--orcamento-nucleo", type=float, default=ORCAMENTO_NUCLEO,
+                        help=f"mediana máxima do núcleo, em segundos (padrão: {ORCAMENTO_NUCLEO})")
+    parser.add_argument("--json", action="store_true", help="imprime o resultado em JSON")
+    args = parser.parse_args(argv)
+
+    alvos = [
+        ("app", importacoes_do_topo(SCRIPT_APP), args.orcamento_app),
+        ("nucleo", "import analisador_kml", args.orcamento_nucleo),
+    ]
+
+    resultados = []
+    for nome, importacoes, orcamento in alvos:
+        tempos, pesados = medir(importacoes, args.rodadas)
+        mediana = statistics.median(tempos)
+        resultados.append({
+            "alvo": nome,
+            "mediana_s": round(mediana, 4),
+            "minimo_s": round(min(tempos), 4),
+            "maximo_s": round(max(tempos), 4),
+            "orcamento_s": orcamento,
+            "pesados_carregados": pesados,
+            "ok": mediana <= orcamento and not pesados,
+        })
+
+    if args.json:
+        print(json.dumps(resultados, ensure_ascii=False))
+    else:
+        for resultado in resultados:
+            situacao = "ok" if resultado["ok"] else "FALHOU"
+            print(f"{resultado['alvo']:7s} mediana {resultado['mediana_s']:.3f} s "
+                  f"(mín {resultado['minimo_s']:.3f}, máx {resultado['maximo_s']:.3f}) "
+                  f"orçamento {resultado['orcamento_s']:.3f} s  {situacao}")
+            if resultado["pesados_carregados"]:
+                print(f"        carregados na importação: {', '.join(resultado['pesados_carregados'])}")
+
+    return 0 if all(resultado["ok"] for resultado in resultados) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
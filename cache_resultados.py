@@ -0,0 +1,106 @@
+"""
+Cache LRU em memória, limitado em bytes, para resultados de processamento
+endereçados pelo conteúdo do arquivo (hash dos bytes enviados).
+"""
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+
+def hash_conteudo(conteudo):
+    """Hash hexadecimal dos bytes (ou buffer) de um arquivo."""
+    return hashlib.blake2b(conteudo, digest_size=20).hexdigest()
+
+
+def estimar_tamanho(valor):
+    """
+    Memória aproximada, em bytes, ocupada por um objeto e tudo o que ele
+    referencia (contêineres, atributos e buffers de arrays NumPy). Objetos
+    compartilhados são contados uma única vez.
+    """
+    vistos = set()
+    pendentes = [valor]
+    total = 0
+    while pendentes:
+        objeto = pendentes.pop()
+        if id(objeto) in vistos:
+            continue
+        vistos.add(id(objeto))
+        total += sys.getsizeof(objeto)
+
+        if isinstance(objeto, (str, bytes, bytearray, int, float, bool, type(None))):
+            continue
+        if isinstance(objeto, dict):
+            pendentes.extend(objeto.keys())
+            pendentes.extend(objeto.values())
+        elif isinstance(objeto, (list, tuple, set, frozenset)):
+            pendentes.extend(objeto)
+        elif hasattr(objeto, "nbytes") and hasattr(objeto, "base"):
+            # Array NumPy: getsizeof já inclui os dados próprios; visões apontam para a base
+            if objeto.base is not None:
+                pendentes.append(objeto.base)
+        elif hasattr(objeto, "__dict__"):
+            pendentes.append(vars(objeto))
+    return total
+
+
+class CacheLRU:
+    """
+    Dicionário com descarte do item usado há mais tempo quando a soma dos
+    tamanhos passa de ``limite_bytes``. Seguro para uso entre threads (cada
+    sessão do Streamlit roda em uma thread própria).
+
+    Os valores são devolvidos sem cópia: quem os lê não deve modificá-los.
+    """
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self._itens = OrderedDict()
+        self._tamanhos = {}
+        self._total = 0
+        self._trava = threading.Lock()
+
+    def __contains__(self, chave):
+        with self._trava:
+            return chave in self._itens
+
+    def __len__(self):
+        return len(self._itens)
+
+    @property
+    def tamanho_total(self):
+        return self._total
+
+    def obter(self, chave, padrao=None):
+        with self._trava:
+            if chave not in self._itens:
+                return padrao
+            self._itens.move_to_end(chave)
+            return self._itens[chave]
+
+    def guardar(self, chave, valor, tamanho=None):
+        """Guarda o valor e devolve True, ou False se ele sozinho não couber no limite."""
+        if tamanho is None:
+            tamanho = estimar_tamanho(valor)
+        if tamanho > self.limite_bytes:
+            return False
+
+        with self._trava:
+            if chave in self._itens:
+                self._total -= self._tamanhos.pop(chave)
+                del self._itens[chave]
+            self._itens[chave] = valor
+            self._tamanhos[chave] = tamanho
+            self._total += tamanho
+
+            while self._total > self.limite_bytes:
+                antiga, _ = self._itens.popitem(last=False)
+                self._total -= self._tamanhos.pop(antiga)
+        return True
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self._tamanhos.clear()
+            self._total = 0
@@ -0,0 +1,183 @@
+"""
+Motor vetorizado de distâncias geodésicas (elipsoide WGS84).
+
+Substitui as chamadas a ``geopy.distance.geodesic`` feitas segmento a segmento
+por um cálculo em lote com NumPy: recebe o array de coordenadas de uma
+LineString, ou de várias LineStrings de uma vez, e devolve o comprimento de
+cada linha em uma única chamada.
+
+Tolerância: a fórmula inversa de Vincenty difere do algoritmo de Karney usado
+pelo geopy em menos de 1 mm por segmento para pontos não antipodais. Como o
+aplicativo arredonda o comprimento de cada linha para metros inteiros, os
+totais coincidem com os do geopy, exceto quando a soma cai a menos de 1 mm de
+um meio metro. Segmentos em que a iteração não converge (pontos quase
+antipodais, que não ocorrem em rotas de fibra) são calculados pelo geopy.
+
+Os comprimentos calculados ficam em um cache endereçado pelo conteúdo (hash
+da sequência de coordenadas), compartilhado entre as execuções do script, de
+forma que nenhuma LineString é medida duas vezes.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Parâmetros do elipsoide WGS84
+SEMI_EIXO_MAIOR = 6378137.0
+ACHATAMENTO = 1 / 298.257223563
+SEMI_EIXO_MENOR = SEMI_EIXO_MAIOR * (1 - ACHATAMENTO)
+
+MAX_ITERACOES = 200
+TOLERANCIA_LAMBDA = 1e-12
+
+# Quantidade máxima de comprimentos mantidos no cache (descarte LRU)
+MAX_ENTRADAS_CACHE = 500_000
+
+_cache_distancias = OrderedDict()
+_trava_cache = threading.Lock()
+
+
+def _como_array(coordenadas):
+    """Converte uma sequência de (lat, lon) em um array float64 (N, 2)."""
+    array = np.asarray(coordenadas, dtype=np.float64)
+    if array.size == 0:
+        return np.empty((0, 2), dtype=np.float64)
+    return array.reshape(-1, 2)
+
+
+def distancias_segmentos(lat1, lon1, lat2, lon2):
+    """
+    Distância em metros entre pares de pontos (graus decimais), vetorizada.
+    Aceita arrays de qualquer formato compatível e devolve um array float64.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        *(np.asarray(valor, dtype=np.float64) for valor in (lat1, lon1, lat2, lon2))
+    )
+    delta_lon = np.radians(lon2 - lon1)
+
+    u1 = np.arctan((1 - ACHATAMENTO) * np.tan(np.radians(lat1)))
+    u2 = np.arctan((1 - ACHATAMENTO) * np.tan(np.radians(lat2)))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+
+    lam = delta_lon.copy()
+    convergiu = np.zeros(lam.shape, dtype=bool)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(MAX_ITERACOES):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            c = ACHATAMENTO / 16 * cos2_alpha * (4 + ACHATAMENTO * (4 - 3 * cos2_alpha))
+
+            lam_anterior = lam
+            lam = delta_lon + (1 - c) * ACHATAMENTO * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+            )
+            convergiu = np.abs(lam - lam_anterior) <= TOLERANCIA_LAMBDA
+            if convergiu.all():
+                break
+
+        u_quadrado = cos2_alpha * (SEMI_EIXO_MAIOR ** 2 - SEMI_EIXO_MENOR ** 2) / SEMI_EIXO_MENOR ** 2
+        coef_a = 1 + u_quadrado / 16384 * (4096 + u_quadrado * (-768 + u_quadrado * (320 - 175 * u_quadrado)))
+        coef_b = u_quadrado / 1024 * (256 + u_quadrado * (-128 + u_quadrado * (74 - 47 * u_quadrado)))
+        delta_sigma = coef_b * sin_sigma * (
+            cos_2sigma_m + coef_b / 4 * (
+                cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                - coef_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+            )
+        )
+        distancias = SEMI_EIXO_MENOR * coef_a * (sigma - delta_sigma)
+
+    distancias = np.where(sin_sigma == 0, 0.0, distancias)
+
+    pendentes = ~convergiu | ~np.isfinite(distancias)
+    if pendentes.any():
+        from geopy.distance import geodesic
+
+        distancias = np.array(distancias, dtype=np.float64)
+        for indice in map(tuple, np.argwhere(pendentes)):
+            distancias[indice] = geodesic((lat1[indice], lon1[indice]), (lat2[indice], lon2[indice])).meters
+
+    return distancias
+
+
+def chave_coordenadas(pontos):
+    """Chave de conteúdo de um array (N, 2) de coordenadas."""
+    return hashlib.blake2b(np.ascontiguousarray(pontos).data, digest_size=16).digest()
+
+
+def limpar_cache_distancias():
+    with _trava_cache:
+        _cache_distancias.clear()
+
+
+def distancia_linestring(coordenadas):
+    """Comprimento em metros (sem arredondamento) de uma sequência de (lat, lon)."""
+    return float(distancias_linestrings([coordenadas])[0])
+
+
+def distancias_linestrings(linhas, usar_cache=True):
+    """
+    Comprimento em metros (sem arredondamento) de várias LineStrings em uma
+    única chamada vetorizada. ``linhas`` é uma sequência de sequências de
+    (lat, lon); o retorno é um array float64 com um valor por linha.
+
+    Com ``usar_cache``, só as linhas ainda não vistas são medidas.
+    """
+    arrays = [_como_array(linha) for linha in linhas]
+    if not arrays:
+        return np.zeros(0, dtype=np.float64)
+    if not usar_cache:
+        return _medir_linestrings(arrays)
+
+    chaves = [chave_coordenadas(array) for array in arrays]
+    resultado = np.empty(len(arrays), dtype=np.float64)
+    pendentes = []
+    with _trava_cache:
+        for indice, chave in enumerate(chaves):
+            distancia = _cache_distancias.get(chave)
+            if distancia is None:
+                pendentes.append(indice)
+            else:
+                _cache_distancias.move_to_end(chave)
+                resultado[indice] = distancia
+
+    if pendentes:
+        medidas = _medir_linestrings([arrays[indice] for indice in pendentes])
+        resultado[pendentes] = medidas
+        with _trava_cache:
+            for indice, distancia in zip(pendentes, medidas.tolist()):
+                _cache_distancias[chaves[indice]] = distancia
+            while len(_cache_distancias) > MAX_ENTRADAS_CACHE:
+                _cache_distancias.popitem(last=False)
+
+    return resultado
+
+
+def _medir_linestrings(arrays):
+    """Mede uma lista de arrays (N, 2) concatenando todos os segmentos em um só lote."""
+    tamanhos = np.fromiter((len(array) for array in arrays), dtype=np.int64, count=len(arrays))
+    pontos = np.concatenate(arrays)
+    if len(pontos) < 2:
+        return np.zeros(len(arrays), dtype=np.float64)
+
+    segmentos = distancias_segmentos(pontos[:-1, 0], pontos[:-1, 1], pontos[1:, 0], pontos[1:, 1])
+
+    # Zera os "segmentos" que ligam o último ponto de uma linha ao primeiro da seguinte
+    inicios = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+    fronteiras = inicios[1:] - 1
+    segmentos[fronteiras[(fronteiras >= 0) & (fronteiras < len(segmentos))]] = 0.0
+
+    acumulado = np.concatenate(([0.0], np.cumsum(segmentos)))
+    # Linhas vazias no fim do lote começam depois do último ponto; limita os
+    # índices e zera essas linhas
+    ultimo = len(acumulado) - 1
+    fins = np.minimum(inicios + np.maximum(tamanhos - 1, 0), ultimo)
+    return np.where(tamanhos > 0, acumulado[fins] - acumulado[np.minimum(inicios, ultimo)], 0.0)
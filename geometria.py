@@ -0,0 +1,67 @@
+"""
+Armazenamento colunar das LineStrings de um documento.
+
+Todas as coordenadas ficam em um único array contíguo (N, 2) de (lat, lon),
+em float64 (16 bytes por vértice) ou, opcionalmente, float32 (8 bytes por
+vértice). Um array de offsets marca onde cada LineString começa. Os registros
+do documento guardam apenas o índice da linha, e os consumidores recebem
+visões (slices sem cópia) do array.
+"""
+import numpy as np
+
+FATOR_CRESCIMENTO = 1.5
+
+
+class GeometriaColunar:
+    def __init__(self, dtype=np.float64, capacidade=1024):
+        self.dtype = np.dtype(dtype)
+        self._dados = np.empty((capacidade, 2), dtype=self.dtype)
+        self._usados = 0
+        self._offsets = [0]
+        self._offsets_array = None
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    @property
+    def coordenadas(self):
+        """Array (N, 2) com os vértices de todas as linhas, em ordem."""
+        return self._dados[:self._usados]
+
+    @property
+    def offsets(self):
+        """Array int64 com len(self) + 1 posições: a linha i ocupa offsets[i]:offsets[i + 1]."""
+        if self._offsets_array is None or len(self._offsets_array) != len(self._offsets):
+            self._offsets_array = np.asarray(self._offsets, dtype=np.int64)
+        return self._offsets_array
+
+    @property
+    def nbytes(self):
+        return self._dados.nbytes + self.offsets.nbytes
+
+    def adicionar(self, pontos):
+        """Acrescenta uma linha (array-like (N, 2) de lat, lon) e devolve o seu índice."""
+        pontos = np.asarray(pontos, dtype=self.dtype).reshape(-1, 2)
+        fim = self._usados + len(pontos)
+        if fim > len(self._dados):
+            capacidade = max(fim, int(len(self._dados) * FATOR_CRESCIMENTO) + 1)
+            novos = np.empty((capacidade, 2), dtype=self.dtype)
+            novos[:self._usados] = self._dados[:self._usados]
+            self._dados = novos
+        self._dados[self._usados:fim] = pontos
+        self._usados = fim
+        self._offsets.append(fim)
+        return len(self._offsets) - 2
+
+    def finalizar(self):
+        """Libera a capacidade reservada e não usada, ao fim da leitura."""
+        if len(self._dados) != self._usados:
+            self._dados = self._dados[:self._usados].copy()
+        self._offsets_array = None
+
+    def linha(self, indice):
+        """Visão (sem cópia) das coordenadas da linha ``indice``."""
+        return self._dados[self._offsets[indice]:self._offsets[indice + 1]]
+
+    def linhas(self, indices):
+        return [self.linha(indice) for indice in indices]
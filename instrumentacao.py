@@ -0,0 +1,188 @@
+"""
+Medição das etapas do analisador: tempo de parede, tempo de CPU e pico de memória.
+
+Cada etapa (``medir_etapa`` ou o decorador ``instrumentado``) gera um
+``RegistroEtapa``, guardado nas coletas ativas da thread (``coletar`` e
+``iniciar_execucao``) e emitido como uma linha JSON no logger ``analisador_kml.etapas``:
+
+    {"ts": "...", "evento": "etapa", "etapa": "processar_kml", "nivel": 0,
+     "parede_s": 0.1234, "cpu_s": 0.1201, "pico_memoria_bytes": 5242880}
+
+O pico de memória vem do tracemalloc e só é medido com ``ativar_memoria(True)``
+(ou KML_MEDIR_MEMORIA=1), porque o rastreamento deixa as alocações mais
+lentas; sem ele, ``pico_memoria_bytes`` é None. O pico de uma etapa inclui o
+das etapas aninhadas. Os valores são do processo atual: a medição feita nos
+processos do pool (processamento_paralelo) entra no tempo de parede, mas não
+no tempo de CPU nem na memória, e o tracemalloc soma as alocações de todas as
+sessões do Streamlit que estiverem rodando ao mesmo tempo.
+
+Por padrão o logger não tem destino; ``configurar_log`` (ou KML_LOG_ETAPAS
+com "stderr" ou o caminho de um arquivo) grava as linhas JSON.
+"""
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger("analisador_kml.etapas")
+
+# Medição de memória ligada desde o início (KML_MEDIR_MEMORIA=1)
+MEMORIA_PADRAO = os.environ.get("KML_MEDIR_MEMORIA") == "1"
+
+_estado = threading.local()
+_memoria_ativada_aqui = False
+
+
+class RegistroEtapa(NamedTuple):
+    etapa: str
+    nivel: int  # profundidade: 0 para as etapas de fora, 1 para as que rodam dentro delas...
+    parede_s: float
+    cpu_s: float
+    pico_memoria_bytes: Optional[int]  # None sem o tracemalloc ativo
+    detalhes: dict
+
+
+class _Quadro:
+    __slots__ = ("memoria_inicial", "pico")
+
+    def __init__(self, memoria_inicial):
+        self.memoria_inicial = memoria_inicial
+        self.pico = memoria_inicial
+
+
+def _pilha():
+    if not hasattr(_estado, "pilha"):
+        _estado.pilha = []
+        _estado.coletas = []
+        _estado.execucao = None
+    return _estado.pilha
+
+
+def ativar_memoria(ativo=True):
+    """
+    Liga ou desliga a medição do pico de memória (tracemalloc) do processo inteiro,
+    inclusive das outras sessões do Streamlit; o app só a liga por KML_MEDIR_MEMORIA.
+    """
+    global _memoria_ativada_aqui
+    if ativo and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _memoria_ativada_aqui = True
+    elif not ativo and _memoria_ativada_aqui and tracemalloc.is_tracing():
+        tracemalloc.stop()
+        _memoria_ativada_aqui = False
+
+
+def configurar_log(destino=None):
+    """
+    Grava as linhas JSON das etapas em `destino` ("stderr", o caminho de um arquivo ou
+    um stream). Chamadas repetidas não duplicam o destino.
+    """
+    destino = sys.stderr if destino in (None, "stderr", "1") else destino
+    for handler in logger.handlers:
+        if getattr(handler, "destino_etapas", None) == destino:
+            return
+    if isinstance(destino, str):
+        handler = logging.FileHandler(destino, encoding="utf-8")
+    else:
+        handler = logging.StreamHandler(destino)
+    handler.destino_etapas = destino
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+@contextmanager
+def coletar():
+    """Junta, na lista devolvida, os registros das etapas executadas nesta thread dentro do bloco."""
+    _pilha()
+    registros = []
+    _estado.coletas.append(registros)
+    try:
+        yield registros
+    finally:
+        _estado.coletas.remove(registros)
+
+
+def iniciar_execucao():
+    """
+    Começa a coleta principal da thread (uma por execução do script do Streamlit, que
+    não tem um bloco em volta de tudo) e devolve a lista que receberá os registros.
+    """
+    _pilha()
+    _estado.execucao = []
+    return _estado.execucao
+
+
+@contextmanager
+def medir_etapa(etapa, **detalhes):
+    """Mede o bloco como a etapa `etapa`; `detalhes` vão para o registro e o log."""
+    pilha = _pilha()
+    memoria = tracemalloc.is_tracing()
+    if memoria:
+        _, pico = tracemalloc.get_traced_memory()
+        if pilha:
+            # O pico da etapa de fora não pode se perder com o reset abaixo
+            pilha[-1].pico = max(pilha[-1].pico, pico)
+        tracemalloc.reset_peak()
+    quadro = _Quadro(tracemalloc.get_traced_memory()[0] if memoria else 0)
+    pilha.append(quadro)
+    inicio_parede = time.perf_counter()
+    inicio_cpu = time.process_time()
+    try:
+        yield
+    finally:
+        parede = time.perf_counter() - inicio_parede
+        cpu = time.process_time() - inicio_cpu
+        pilha.pop()
+        pico_memoria = None
+        if memoria and tracemalloc.is_tracing():
+            pico = max(quadro.pico, tracemalloc.get_traced_memory()[1])
+            pico_memoria = pico - quadro.memoria_inicial
+            if pilha:
+                pilha[-1].pico = max(pilha[-1].pico, pico)
+        _registrar(RegistroEtapa(etapa, len(pilha), parede, cpu, pico_memoria, detalhes))
+
+
+def _registrar(registro):
+    if _estado.execucao is not None:
+        _estado.execucao.append(registro)
+    for registros in _estado.coletas:
+        registros.append(registro)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "evento": "etapa",
+            "etapa": registro.etapa,
+            "nivel": registro.nivel,
+            "parede_s": round(registro.parede_s, 6),
+            "cpu_s": round(registro.cpu_s, 6),
+            "pico_memoria_bytes": registro.pico_memoria_bytes,
+            **registro.detalhes,
+        }, ensure_ascii=False, default=str))
+
+
+def instrumentado(funcao=None, *, etapa=None):
+    """Decorador: cada chamada da função é medida como a etapa `etapa` (padrão: o nome dela)."""
+    def decorar(funcao):
+        nome = etapa or funcao.__name__
+
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with medir_etapa(nome):
+                return funcao(*args, **kwargs)
+        return medida
+
+    return decorar(funcao) if funcao is not None else decorar
+
+
+if MEMORIA_PADRAO:
+    ativar_memoria(True)
+if os.environ.get("KML_LOG_ETAPAS"):
+    configurar_log(os.environ["KML_LOG_ETAPAS"])
@@ -0,0 +1,241 @@
+"""
+Medição das LineStrings em vários processos (``ProcessPoolExecutor``).
+
+As pastas LINK e os POPs das pastas GPON são independentes entre si: cada
+grupo de linhas vira uma tarefa, medida em um processo separado (comprimento
+geodésico e importância dos vértices para o mapa), e os resultados voltam
+para arrays alinhados à ``GeometriaColunar`` do documento. Arquivos pequenos
+são medidos no próprio processo, em um único lote vetorizado, porque o custo
+de enviar as coordenadas aos processos superaria o ganho.
+
+No modo de vários arquivos, cada arquivo é lido e medido inteiro em um
+processo (``ler_e_medir_arquivos``).
+
+As funções executadas nos processos ficam neste módulo (e não no script do
+Streamlit) para que possam ser importadas por eles.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import NamedTuple
+
+import numpy as np
+from lxml import etree
+
+import geodesia
+import leitor_kml
+import simplificacao
+
+# Quantidade de processos; 1 desativa o paralelismo
+PROCESSOS = int(os.environ.get("KML_PROCESSOS", str(os.cpu_count() or 1)))
+# Abaixo desta quantidade de vértices a medição é feita no próprio processo
+MIN_VERTICES_PARALELO = int(os.environ.get("KML_MIN_VERTICES_PARALELO", "200000"))
+# Tarefas por processo: grupos grandes são divididos para equilibrar a carga
+TAREFAS_POR_PROCESSO = 4
+
+_executor = None
+_processos_executor = 0
+_trava_executor = threading.Lock()
+
+
+class MedidasLinhas(NamedTuple):
+    comprimentos: np.ndarray  # metros, um por LineString (NaN nas que não foram medidas)
+    importancia: np.ndarray  # float32, um por vértice, alinhado a geometria.coordenadas
+
+    def importancia_linha(self, geometria, indice):
+        """Visão (sem cópia) da importância dos vértices da linha ``indice``."""
+        return self.importancia[geometria.offsets[indice]:geometria.offsets[indice + 1]]
+
+
+def _obter_executor(processos):
+    """Pool persistente entre as execuções do script; recriado se o tamanho mudar."""
+    global _executor, _processos_executor
+    with _trava_executor:
+        if _executor is None or _processos_executor != processos:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+            # "spawn" não herda as threads do servidor do Streamlit
+            _executor = ProcessPoolExecutor(processos, mp_context=multiprocessing.get_context("spawn"))
+            _processos_executor = processos
+        return _executor
+
+
+def _descartar_executor():
+    global _executor
+    with _trava_executor:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def medir_tarefa(linhas, com_importancia):
+    """
+    Executada em cada processo: comprimento de todas as ``linhas`` e a
+    importância dos vértices das linhas marcadas em ``com_importancia``.
+    """
+    comprimentos = geodesia.distancias_linestrings(linhas)
+    marcadas = [linha for linha, marcada in zip(linhas, com_importancia) if marcada]
+    return comprimentos, simplificacao.importancia_vertices(marcadas)
+
+
+def _dividir_tarefas(grupos, tamanhos, limite_vertices):
+    """Quebra cada grupo de índices em tarefas de até ``limite_vertices`` vértices (linhas inteiras)."""
+    tarefas = []
+    for indices in grupos:
+        atual, vertices = [], 0
+        for indice in indices:
+            atual.append(indice)
+            vertices += tamanhos[indice]
+            if vertices >= limite_vertices:
+                tarefas.append(atual)
+                atual, vertices = [], 0
+        if atual:
+            tarefas.append(atual)
+    return tarefas
+
+
+def medir_linhas(geometria, grupos, processos=None, min_vertices=None):
+    """
+    Mede as LineStrings de ``geometria`` listadas em ``grupos``, uma sequência
+    de ``(indices, com_importancia)`` (por exemplo, uma por pasta LINK ou POP).
+    Linhas repetidas entre grupos são medidas uma vez; a importância é
+    calculada se algum dos grupos a pedir.
+
+    Com ``processos`` > 1 e ao menos ``min_vertices`` vértices, os grupos são
+    medidos em paralelo; caso contrário (ou se o pool falhar), em série.
+    """
+    processos = PROCESSOS if processos is None else processos
+    min_vertices = MIN_VERTICES_PARALELO if min_vertices is None else min_vertices
+
+    tamanhos = np.diff(geometria.offsets)
+    medida = np.zeros(len(geometria), dtype=bool)
+    com_importancia = np.zeros(len(geometria), dtype=bool)
+    proprias = []  # linhas de cada grupo ainda não atribuídas a um grupo anterior
+    for indices, importancia in grupos:
+        indices = np.asarray(indices, dtype=np.int64)
+        novas = indices[~medida[indices]]
+        medida[novas] = True
+        proprias.append(novas.tolist())
+        if importancia:
+            com_importancia[indices] = True
+
+    medidas = MedidasLinhas(
+        np.full(len(geometria), np.nan),
+        np.zeros(len(geometria.coordenadas), dtype=np.float32),
+    )
+    if not medida.any():
+        return medidas
+
+    vertices = int(tamanhos[medida].sum())
+    if processos > 1 and vertices >= min_vertices:
+        tarefas = _dividir_tarefas(proprias, tamanhos, max(1, vertices // (processos * TAREFAS_POR_PROCESSO)))
+        try:
+            executor = _obter_executor(processos)
+            resultados = list(executor.map(
+                medir_tarefa,
+                [geometria.linhas(tarefa) for tarefa in tarefas],
+                [com_importancia[tarefa] for tarefa in tarefas],
+            ))
+        except BrokenProcessPool:
+            _descartar_executor()
+        else:
+            for tarefa, resultado in zip(tarefas, resultados):
+                _guardar(medidas, geometria, tarefa, com_importancia, resultado)
+            return medidas
+
+    tarefa = [indice for indices in proprias for indice in indices]
+    _guardar(medidas, geometria, tarefa, com_importancia,
+             medir_tarefa(geometria.linhas(tarefa), com_importancia[tarefa]))
+    return medidas
+
+
+def _guardar(medidas, geometria, tarefa, com_importancia, resultado):
+    comprimentos, importancias = resultado
+    medidas.comprimentos[tarefa] = comprimentos
+    marcadas = [indice for indice in tarefa if com_importancia[indice]]
+    for indice, importancia in zip(marcadas, importancias):
+        medidas.importancia[geometria.offsets[indice]:geometria.offsets[indice + 1]] = importancia
+
+
+def medir_documento(documento, processos=None):
+    """
+    Mede todas as LineStrings das pastas LINK (fora de GPON) e dos POPs das
+    pastas GPON, com um grupo por pasta. As linhas das pastas LINK também
+    recebem a importância dos vértices, usada nos níveis de detalhe do mapa.
+    """
+    def linhas_em(pasta, parar_em):
+        return [line_string.indice for placemark in documento.placemarks_em(pasta, parar_em=parar_em)
+                for line_string in placemark.linestrings]
+
+    def outra_pasta_link(pasta):
+        return documento.indice[pasta].is_link
+
+    def outra_pasta_gpon(pasta):
+        return documento.indice[pasta].is_gpon
+
+    grupos = []
+    for folder in documento.descendentes():
+        info_folder = documento.indice[folder]
+        if info_folder.is_link and not info_folder.dentro_gpon:
+            grupos.append((linhas_em(folder, outra_pasta_link), True))
+        if info_folder.is_gpon:
+            for subpasta in documento.subpastas(folder):
+                grupos.append((linhas_em(subpasta, outra_pasta_gpon), False))
+
+    return medir_linhas(documento.geometria, grupos, processos)
+
+
+def ler_e_medir(conteudo, processos=1):
+    """
+    Executada em cada processo no modo de vários arquivos: lê o KML (bytes) e
+    mede as suas linhas com ``processos`` processos. Erros de leitura voltam
+    como ``ValueError``, porque as exceções do lxml não podem ser enviadas
+    entre processos.
+    """
+    try:
+        documento = leitor_kml.ler_kml(BytesIO(conteudo))
+    except etree.XMLSyntaxError as erro:
+        raise ValueError(f"Erro de sintaxe no arquivo KML: {erro}") from None
+    return documento, medir_documento(documento, processos)
+
+
+def ler_e_medir_arquivos(conteudos, processos=None):
+    """
+    Lê e mede vários arquivos, um por processo, e devolve, na mesma ordem, o
+    par ``(documento, medidas)`` de cada um ou a exceção que ele gerou. Um
+    arquivo sozinho é lido aqui e medido com os ``processos`` processos.
+    """
+    processos = PROCESSOS if processos is None else processos
+
+    def em_serie(processos_medicao=1):
+        resultados = []
+        for conteudo in conteudos:
+            try:
+                resultados.append(ler_e_medir(conteudo, processos_medicao))
+            except Exception as erro:
+                resultados.append(erro)
+        return resultados
+
+    if len(conteudos) < 2:
+        return em_serie(processos)
+    if processos <= 1:
+        return em_serie()
+
+    try:
+        executor = _obter_executor(processos)
+        futuros = [executor.submit(ler_e_medir, conteudo) for conteudo in conteudos]
+        resultados = []
+        for futuro in futuros:
+            try:
+                resultados.append(futuro.result())
+            except BrokenProcessPool:
+                raise
+            except Exception as erro:
+                resultados.append(erro)
+        return resultados
+    except BrokenProcessPool:
+        _descartar_executor()
+        return em_serie()
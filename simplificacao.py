@@ -0,0 +1,137 @@
+"""
+Simplificação de LineStrings para exibição no mapa (Douglas-Peucker vetorizado).
+
+Em vez de simplificar uma vez para cada tolerância, o algoritmo é executado
+uma única vez e registra a "importância" de cada vértice: a distância (em
+metros) com que ele foi selecionado, limitada pela importância do vértice que
+dividiu o trecho anterior. Manter os vértices com importância maior que uma
+tolerância reproduz o resultado de Douglas-Peucker para essa tolerância, então
+cada nível de detalhe do mapa é só uma máscara sobre o mesmo array.
+
+Todos os trechos pendentes (de todas as linhas) são processados juntos em cada
+rodada, com operações NumPy; o número de rodadas acompanha a profundidade da
+recursão, e não o número de vértices.
+"""
+import numpy as np
+
+RAIO_TERRA = 6371008.8
+
+# Tolerância (metros) de cada nível de detalhe. Os valores acompanham o tamanho
+# aproximado de um pixel no zoom indicado, nas latitudes do Nordeste.
+NIVEIS_DETALHE = {
+    "Baixo (zoom até 8)": 500.0,
+    "Médio (zoom 9 a 13)": 40.0,
+    "Alto (zoom 14 ou mais)": 5.0,
+    "Completo": 0.0,
+}
+# Menor zoom de cada nível; o "Completo" só é usado quando escolhido
+ZOOM_MINIMO_NIVEL = {
+    "Baixo (zoom até 8)": 0,
+    "Médio (zoom 9 a 13)": 9,
+    "Alto (zoom 14 ou mais)": 14,
+}
+# Zoom com que o mapa abre (analisador_kml.criar_mapa)
+ZOOM_INICIAL_MAPA = 5
+
+
+def nivel_para_zoom(zoom):
+    """Nível de detalhe do intervalo de zoom que contém `zoom`."""
+    return max((nivel for nivel, minimo in ZOOM_MINIMO_NIVEL.items() if minimo <= zoom), key=ZOOM_MINIMO_NIVEL.get)
+
+
+# O mapa abre no nível do zoom inicial; o usuário escolhe outro ao aproximar
+NIVEL_PADRAO = nivel_para_zoom(ZOOM_INICIAL_MAPA)
+
+# Abaixo desta distância nenhum nível distingue os vértices, então a divisão para
+TOLERANCIA_MINIMA = min(tolerancia for tolerancia in NIVEIS_DETALHE.values() if tolerancia > 0)
+
+
+def _projetar(pontos, tamanhos):
+    """Projeção equiretangular em metros, centrada na latitude média de cada linha."""
+    inicios = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+    # reduceat só nas linhas com pontos: uma linha vazia no fim começaria
+    # depois do último ponto
+    validas = tamanhos > 0
+    lat_media = np.zeros(len(tamanhos))
+    if validas.any():
+        lat_media[validas] = np.add.reduceat(pontos[:, 0], inicios[validas]) / tamanhos[validas]
+    escala_x = np.repeat(np.cos(np.radians(lat_media)), tamanhos)
+    y = np.radians(pontos[:, 0]) * RAIO_TERRA
+    x = np.radians(pontos[:, 1]) * RAIO_TERRA * escala_x
+    return x, y
+
+
+def _distancia_ao_segmento(px, py, ax, ay, bx, by):
+    dx, dy = bx - ax, by - ay
+    comprimento2 = dx * dx + dy * dy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(comprimento2 > 0, ((px - ax) * dx + (py - ay) * dy) / comprimento2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def importancia_vertices(linhas, tolerancia_minima=TOLERANCIA_MINIMA):
+    """
+    Importância (metros, float32) de cada vértice de cada linha. ``linhas`` é
+    uma sequência de sequências de (lat, lon); o retorno é uma lista de arrays,
+    um por linha. As extremidades têm importância infinita; vértices que nunca
+    superam ``tolerancia_minima`` ficam com 0.
+    """
+    arrays = [np.asarray(linha, dtype=np.float64).reshape(-1, 2) for linha in linhas]
+    if not arrays:
+        return []
+
+    tamanhos = np.fromiter((len(array) for array in arrays), dtype=np.int64, count=len(arrays))
+    pontos = np.concatenate(arrays)
+    importancia = np.zeros(len(pontos), dtype=np.float64)
+
+    inicios = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+    validas = tamanhos > 0
+    fins = inicios + tamanhos - 1
+    importancia[inicios[validas]] = np.inf
+    importancia[fins[validas]] = np.inf
+
+    x, y = _projetar(pontos, tamanhos)
+
+    # Trechos pendentes: (primeiro vértice, último vértice, limite herdado)
+    a = inicios[tamanhos > 2]
+    b = fins[tamanhos > 2]
+    limite = np.full(len(a), np.inf)
+
+    while len(a):
+        internos = b - a - 1
+        deslocamentos = np.concatenate(([0], np.cumsum(internos)[:-1]))
+        trecho = np.repeat(np.arange(len(a)), internos)
+        indices = np.arange(internos.sum()) - np.repeat(deslocamentos, internos) + np.repeat(a + 1, internos)
+
+        distancias = _distancia_ao_segmento(
+            x[indices], y[indices], x[a][trecho], y[a][trecho], x[b][trecho], y[b][trecho]
+        )
+        maximos = np.maximum.reduceat(distancias, deslocamentos)
+
+        # Primeiro vértice de cada trecho que atinge a distância máxima
+        posicoes = np.where(distancias == maximos[trecho], np.arange(len(distancias)), len(distancias))
+        divisores = indices[np.minimum.reduceat(posicoes, deslocamentos)]
+
+        dividir = maximos > tolerancia_minima
+        a, b, divisores = a[dividir], b[dividir], divisores[dividir]
+        novo_limite = np.minimum(maximos[dividir], limite[dividir])
+        importancia[divisores] = novo_limite
+
+        a, b, limite = (
+            np.concatenate((a, divisores)),
+            np.concatenate((divisores, b)),
+            np.concatenate((novo_limite, novo_limite)),
+        )
+        pendentes = b - a > 1
+        a, b, limite = a[pendentes], b[pendentes], limite[pendentes]
+
+    return np.split(importancia.astype(np.float32), np.cumsum(tamanhos)[:-1])
+
+
+def simplificar(coordenadas, importancia, tolerancia):
+    """Vértices de ``coordenadas`` cuja importância supera a tolerância (metros)."""
+    pontos = np.asarray(coordenadas, dtype=np.float64).reshape(-1, 2)
+    if tolerancia <= 0:
+        return pontos
+    return pontos[importancia > tolerancia]
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+from geopy import distance as geopy_distance
+
+import geodesia
+
+# Tolerância prometida na documentação de geodesia
+TOLERANCIA_M = 1e-3
+
+
+@pytest.fixture
+def chamadas_geopy(monkeypatch):
+    """Conta as chamadas ao geopy (usado só nos segmentos que não convergem)."""
+    chamadas = []
+    original = geopy_distance.geodesic
+
+    def geodesic(*pontos):
+        chamadas.append(pontos)
+        return original(*pontos)
+
+    monkeypatch.setattr(geopy_distance, "geodesic", geodesic)
+    return chamadas
+
+
+def _geopy(lat1, lon1, lat2, lon2):
+    return np.array([
+        geopy_distance.geodesic((a, b), (c, d)).meters for a, b, c, d in zip(lat1, lon1, lat2, lon2)
+    ])
+
+
+def test_pares_aleatorios_coincidem_com_geopy():
+    aleatorio = np.random.default_rng(0)
+    lat1, lat2 = aleatorio.uniform(-89, 89, (2, 2000))
+    lon1, lon2 = aleatorio.uniform(-180, 180, (2, 2000))
+
+    calculadas = geodesia.distancias_segmentos(lat1, lon1, lat2, lon2)
+
+    assert np.abs(calculadas - _geopy(lat1, lon1, lat2, lon2)).max() < TOLERANCIA_M
+
+
+def test_segmentos_curtos_de_rotas_coincidem_com_geopy():
+    aleatorio = np.random.default_rng(1)
+    lat1 = aleatorio.uniform(-10, -3, 500)
+    lon1 = aleatorio.uniform(-45, -35, 500)
+    lat2 = lat1 + aleatorio.normal(0, 0.001, 500)
+    lon2 = lon1 + aleatorio.normal(0, 0.001, 500)
+
+    calculadas = geodesia.distancias_segmentos(lat1, lon1, lat2, lon2)
+
+    assert np.abs(calculadas - _geopy(lat1, lon1, lat2, lon2)).max() < TOLERANCIA_M
+
+
+def test_pontos_iguais_e_polos():
+    lat1 = np.array([-5.0, 90.0, -90.0, 0.0])
+    lon1 = np.array([-42.0, 0.0, 10.0, 180.0])
+    lat2 = np.array([-5.0, 90.0, -90.0, 0.0])
+    lon2 = np.array([-42.0, 120.0, -70.0, -180.0])
+
+    calculadas = geodesia.distancias_segmentos(lat1, lon1, lat2, lon2)
+
+    np.testing.assert_allclose(calculadas, 0.0, atol=TOLERANCIA_M)
+
+
+@pytest.mark.parametrize("ponto_a, ponto_b", [
+    ((0.0, 0.0), (0.0, 179.9)),
+    ((0.0, 0.0), (0.3, 179.7)),
+    ((10.0, 0.0), (-10.0, 179.8)),
+    ((0.0, 0.0), (0.0, 180.0)),
+])
+def test_quase_antipodais_usam_o_geopy(chamadas_geopy, ponto_a, ponto_b):
+    esperada = geopy_distance.geodesic(ponto_a, ponto_b).meters
+    chamadas_geopy.clear()
+
+    calculadas = geodesia.distancias_segmentos([ponto_a[0]], [ponto_a[1]], [ponto_b[0]], [ponto_b[1]])
+
+    assert len(chamadas_geopy) == 1
+    assert abs(calculadas[0] - esperada) < TOLERANCIA_M
+
+
+def test_fallback_aceita_escalares(chamadas_geopy):
+    calculada = geodesia.distancias_segmentos(0.0, 0.0, 0.0, 179.9)
+
+    assert len(chamadas_geopy) == 1
+    assert abs(float(calculada) - geopy_distance.geodesic((0, 0), (0, 179.9)).meters) < TOLERANCIA_M
+
+
+@pytest.mark.parametrize("tamanhos", [(5, 1, 0, 2, 30), (5, 2, 0), (3, 0, 0), (0, 4), (0,), (1, 0)])
+def test_linestrings_em_lote_somam_os_segmentos_de_cada_linha(tamanhos):
+    aleatorio = np.random.default_rng(2)
+    linhas = [
+        np.column_stack([aleatorio.uniform(-10, -3, n), aleatorio.uniform(-45, -35, n)])
+        for n in tamanhos
+    ]
+
+    calculadas = geodesia.distancias_linestrings(linhas, usar_cache=False)
+
+    esperadas = [
+        sum(_geopy(linha[:-1, 0], linha[:-1, 1], linha[1:, 0], linha[1:, 1])) if len(linha) > 1 else 0.0
+        for linha in linhas
+    ]
+    np.testing.assert_allclose(calculadas, esperadas, rtol=0, atol=len(max(linhas, key=len)) * TOLERANCIA_M)
+
+
+def test_cache_nao_mede_a_mesma_linha_duas_vezes(monkeypatch):
+    geodesia.limpar_cache_distancias()
+    medidas = []
+    medir = geodesia._medir_linestrings
+
+    def medir_contando(arrays):
+        medidas.append(len(arrays))
+        return medir(arrays)
+
+    monkeypatch.setattr(geodesia, "_medir_linestrings", medir_contando)
+    linha_a = [(-5.0, -42.0), (-5.01, -42.02), (-5.03, -42.01)]
+    linha_b = [(-7.0, -39.0), (-7.1, -39.2)]
+
+    primeira = geodesia.distancias_linestrings([linha_a, linha_b])
+    segunda = geodesia.distancias_linestrings([linha_b, linha_a, np.array(linha_a)])
+
+    assert medidas == [2]
+    np.testing.assert_array_equal(segunda, [primeira[1], primeira[0], primeira[0]])
+
+    geodesia.limpar_cache_distancias()
+    geodesia.distancias_linestrings([linha_a])
+    assert medidas == [2, 1]
+    geodesia.limpar_cache_distancias()
@@ -0,0 +1,112 @@
+import io
+import struct
+import zipfile
+
+import numpy as np
+import pytest
+
+import leitor_kml
+
+# (texto de <coordinates>, (lat, lon) esperados)
+CASOS = {
+    "2d": ("-42.1,-5.1 -42.2,-5.2 -42.3,-5.3", [(-5.1, -42.1), (-5.2, -42.2), (-5.3, -42.3)]),
+    "3d": ("-42.1,-5.1,0 -42.2,-5.2,10.5 -42.3,-5.3,0", [(-5.1, -42.1), (-5.2, -42.2), (-5.3, -42.3)]),
+    "2d_e_3d": ("-42.1,-5.1,0 -42.2,-5.2 -42.3,-5.3,7", [(-5.1, -42.1), (-5.2, -42.2), (-5.3, -42.3)]),
+    "espacos": (
+        "\n\t  -42.1,-5.1,0\r\n\t-42.2 , -5.2,0   -42.3,\t-5.3 ,0 \n\n  ",
+        [(-5.1, -42.1), (-5.2, -42.2), (-5.3, -42.3)],
+    ),
+    "vazio": ("", []),
+    "so_espacos": (" \n\t ", []),
+}
+
+
+@pytest.fixture(params=["tupla", "numpy", "pyarrow"])
+def caminho(request, monkeypatch):
+    """Configura ler_coordenadas para usar um dos três caminhos de conversão."""
+    if request.param == "tupla":
+        monkeypatch.setattr(leitor_kml, "LIMITE_BYTES_VETORIZADO", float("inf"))
+    else:
+        monkeypatch.setattr(leitor_kml, "LIMITE_BYTES_VETORIZADO", 0)
+    if request.param == "numpy":
+        monkeypatch.setattr(leitor_kml, "_importar_pyarrow", lambda: False)
+    elif request.param == "pyarrow" and not leitor_kml._importar_pyarrow():
+        pytest.skip("pyarrow não instalado")
+    return request.param
+
+
+@pytest.mark.parametrize("caso", CASOS)
+def test_caminhos_dao_o_mesmo_resultado(caminho, caso):
+    texto, esperado = CASOS[caso]
+
+    coordenadas = leitor_kml.ler_coordenadas(texto)
+
+    assert coordenadas.dtype == np.float64
+    assert coordenadas.shape == (len(esperado), 2)
+    np.testing.assert_array_equal(coordenadas, np.array(esperado, dtype=np.float64).reshape(-1, 2))
+
+
+@pytest.mark.parametrize("caso", ["2d", "3d"])
+def test_blocos_uniformes_nao_caem_no_caminho_por_tupla(caso):
+    texto, esperado = CASOS[caso]
+    linhas = texto.encode("ascii").translate(leitor_kml._ESPACOS_PARA_QUEBRA)
+    esperado = np.array(esperado)
+
+    np.testing.assert_array_equal(leitor_kml._ler_coordenadas_numpy(linhas), esperado)
+    pa = leitor_kml._importar_pyarrow()
+    if pa:
+        np.testing.assert_array_equal(leitor_kml._ler_coordenadas_pyarrow(linhas, pa), esperado)
+
+
+def test_texto_grande_coincide_com_o_caminho_por_tupla():
+    aleatorio = np.random.default_rng(0)
+    pontos = aleatorio.uniform(-45, -3, (2000, 3))
+    texto = " ".join(f"{lon:.7f},{lat:.7f},{alt:.1f}" for lon, lat, alt in pontos.tolist())
+    assert len(texto) >= leitor_kml.LIMITE_BYTES_VETORIZADO
+
+    np.testing.assert_array_equal(leitor_kml.ler_coordenadas(texto), leitor_kml._ler_coordenadas_por_tupla(texto))
+
+
+KML_PEQUENO = (
+    '<?xml version="1.0" encoding="UTF-8"?><kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
+    "<Folder><name>LINK TESTE</name><Placemark><name>ROTA 1</name><LineString><coordinates>"
+    + " ".join(f"-42.{n:04d},-5.{n:04d},0" for n in range(200))
+    + "</coordinates></LineString></Placemark></Folder></Document></kml>"
+).encode("utf-8")
+
+
+def _kmz(compressao):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compressao) as kmz:
+        kmz.writestr("doc.kml", KML_PEQUENO)
+    return bytearray(buffer.getvalue())
+
+
+def _inicio_dos_dados(conteudo):
+    """Posição dos dados do primeiro arquivo do zip, depois do cabeçalho local."""
+    tamanho_nome, tamanho_extra = struct.unpack("<HH", conteudo[26:30])
+    return 30 + tamanho_nome + tamanho_extra
+
+
+def test_kmz_valido():
+    documento = leitor_kml.ler_kml(io.BytesIO(bytes(_kmz(zipfile.ZIP_DEFLATED))))
+
+    assert [pasta.nome for pasta in documento.pastas] == ["LINK TESTE"]
+
+
+def test_kmz_com_crc_errado_gera_arquivo_kmz_invalido():
+    conteudo = _kmz(zipfile.ZIP_STORED)
+    posicao = conteudo.index(b"ROTA 1")
+    conteudo[posicao:posicao + 6] = b"ROTA 2"
+
+    with pytest.raises(leitor_kml.ArquivoKMZInvalido):
+        leitor_kml.ler_kml(io.BytesIO(bytes(conteudo)))
+
+
+def test_kmz_com_compressao_corrompida_gera_arquivo_kmz_invalido():
+    conteudo = _kmz(zipfile.ZIP_DEFLATED)
+    inicio = _inicio_dos_dados(conteudo)
+    conteudo[inicio:inicio + 64] = bytes(64)
+
+    with pytest.raises(leitor_kml.ArquivoKMZInvalido):
+        leitor_kml.ler_kml(io.BytesIO(bytes(conteudo)))
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+import simplificacao
+
+
+def _linhas(tamanhos):
+    aleatorio = np.random.default_rng(3)
+    return [
+        np.column_stack([aleatorio.uniform(-5.2, -5.0, n), aleatorio.uniform(-42.9, -42.7, n)])
+        for n in tamanhos
+    ]
+
+
+@pytest.mark.parametrize("tamanhos", [(4, 0, 7), (4, 7, 0), (2, 0, 0), (0,), (0, 5), (1, 0)])
+def test_linhas_vazias_nao_alteram_a_importancia_das_demais(tamanhos):
+    linhas = _linhas(tamanhos)
+
+    em_lote = simplificacao.importancia_vertices(linhas)
+
+    assert [len(importancia) for importancia in em_lote] == list(tamanhos)
+    for linha, importancia in zip(linhas, em_lote):
+        if len(linha):
+            np.testing.assert_array_equal(importancia, simplificacao.importancia_vertices([linha])[0])
+
+
+@pytest.mark.parametrize("nivel", list(simplificacao.NIVEIS_DETALHE))
+def test_linha_vazia_no_fim_gera_mascara_vazia(nivel):
+    linhas = _linhas((6, 0))
+    importancias = simplificacao.importancia_vertices(linhas)
+    tolerancia = simplificacao.NIVEIS_DETALHE[nivel]
+
+    assert simplificacao.simplificar(linhas[1], importancias[1], tolerancia).shape == (0, 2)
+    # As extremidades sempre ficam no desenho
+    pontos = simplificacao.simplificar(linhas[0], importancias[0], tolerancia)
+    np.testing.assert_array_equal(pontos[[0, -1]], linhas[0][[0, -1]])